@@ -0,0 +1,199 @@
+import heapq
+
+require_dependency(module_name = "wedgeutil")
+require_dependency(module_name = "spatial")
+
+from wedgeutil import calc_distance
+from wedgeutil import distance_matrix
+
+# hands free drones out to tasks, all the open slots at once rather than task by task
+# higher priority tasks (lower priority value) are served first, tasks of the same priority form a tier
+# that is solved together for the least total distance travelled
+# every task's units_minimum is filled, tier by tier, before any task gets the rest of its units_needed
+# default tasks only take part for their units_minimum, the drones they get stay free for them to share
+# with the leftovers (their units_assigned is the free drones, so it doesn't count towards what they have)
+# returns a dict of task -> list of drones, closest first
+def assign(tasks, drones):
+  found = {}
+  free = spatial.SpatialIndex(drones)
+
+  tiers = []
+  for task in tasks:
+    if len(tiers) > 0 and tiers[-1][0].priority == task.priority:
+      tiers[-1].append(task)
+    else:
+      tiers.append( [task] )
+
+  for phase in ("minimum", "needed"):
+    for tier in tiers:
+      wants = []
+      for task in tier:
+        have = len(found.get(task, []))
+        if not task.is_default:
+          have += len(task.units_assigned)
+
+        if phase == "minimum":
+          wants.append( max(task.units_minimum - have, 0) )
+        elif task.is_default:
+          wants.append(0)
+        else:
+          wants.append( max(task.units_needed - have, 0) )
+
+      for task, drone in match(tier, wants, free):
+        found.setdefault(task, []).append(drone)
+        free.remove(drone)
+
+  for task, taken in found.items():
+    taken.sort( key = lambda d: calc_distance(task.position, d.position) )
+
+  return found
+
+# each task starts out weighing only its closest wants[i] + spare drones, see match()
+spare = 3
+# above this many task and drone pairs match() hands drones out closest pair first instead, transport() is too slow
+most_pairs = 4000
+
+# the cheapest way to give tasks[i] up to wants[i] drones from free, as a list of (task, drone)
+# as many slots are filled as there are drones for
+# a task only weighs its closest few drones, and more of them only if it comes up short, so this is
+# the cheapest way among those drones rather than among all of them
+# past most_pairs it settles for the closest pair first, which can cost a good deal more
+def match(tasks, wants, free):
+  slots = sum(wants)
+  if slots == 0 or len(free) == 0:
+    return []
+
+  # reach[i] = how many of its closest drones task i weighs
+  # when there are no more drones than slots every one of them gets placed, so each task weighs them all from the start
+  if len(free) <= slots:
+    reach = [ len(free) if w > 0 else 0 for w in wants ]
+  else:
+    reach = [ min(w + spare, len(free)) if w > 0 else 0 for w in wants ]
+  while True:
+    drones = []
+    index = {}
+    near = []
+    for i, task in enumerate(tasks):
+      near.append( [] )
+      for d in free.k_nearest(task.position, reach[i]):
+        if not d in index:
+          index[d] = len(drones)
+          drones.append(d)
+        near[i].append( index[d] )
+
+    # every task to drone distance in one call, as plain numbers for transport()
+    matrix = distance_matrix( [task.position for task in tasks], [d.position for d in drones] )
+    if hasattr(matrix, 'tolist'):
+      matrix = matrix.tolist()
+
+    costs = [ dict( (j, matrix[i][j]) for j in near[i] ) for i in range(len(tasks)) ]
+    if sum( len(n) for n in near ) > most_pairs:
+      owner = closest_pairs(costs, wants, len(drones))
+    else:
+      owner = transport(costs, wants, len(drones))
+
+    # a task left short while there are drones it didn't weigh tries again with twice as many
+    given = [0] * len(tasks)
+    for i in owner:
+      if i != None:
+        given[i] += 1
+
+    short = [ i for i in range(len(tasks)) if given[i] < wants[i] and reach[i] < len(free) ]
+    if len(short) == 0:
+      break
+
+    for i in short:
+      reach[i] = min(reach[i] * 2, len(free))
+
+  return [ (tasks[owner[j]], drones[j]) for j in range(len(drones)) if owner[j] != None ]
+
+# gives drones to tasks closest pair first, same arguments and result as transport()
+def closest_pairs(costs, wants, drones):
+  owner = [None] * drones
+  left = list(wants)
+  pairs = [ (cost, i, j) for i in range(len(costs)) for j, cost in costs[i].items() ]
+  pairs.sort()
+  for cost, i, j in pairs:
+    if left[i] > 0 and owner[j] == None:
+      owner[j] = i
+      left[i] -= 1
+
+  return owner
+
+# min cost assignment of drones to tasks that take several, the Hungarian method run as successive shortest paths
+# costs[i][j] = cost of giving drone j to task i, only for the pairs allowed, task i takes up to wants[i] drones
+# each round finds the cheapest way to fill one more slot, which may move drones already placed to other tasks
+# returns owner, the task each drone went to or None
+def transport(costs, wants, drones):
+  owner = [None] * drones
+  left = list(wants)
+  task_potential = [0] * len(costs)
+  drone_potential = [0] * drones
+
+  while sum(left) > 0:
+    # dijkstra over the reduced costs, from every task with slots left
+    task_dist = {}
+    drone_dist = {}
+    came_from = {}      # came_from[j] = task that reached drone j
+    handed_back = {}    # handed_back[i] = drone of task i that reached it
+    queue = [ (0, 0, i) for i in range(len(costs)) if left[i] > 0 ]
+    for d, kind, i in queue:
+      task_dist[i] = 0
+
+    end = None
+    while len(queue) > 0:
+      d, kind, n = heapq.heappop(queue)
+      if kind == 2:
+        # the closest drone nobody has yet ends the cheapest path
+        end = (d, n)
+        break
+      elif kind == 0:
+        if d > task_dist[n]:
+          continue
+        for j, cost in costs[n].items():
+          if owner[j] == n:
+            continue
+          nd = d + cost + task_potential[n] - drone_potential[j]
+          if not j in drone_dist or nd < drone_dist[j]:
+            drone_dist[j] = nd
+            came_from[j] = n
+            heapq.heappush(queue, (nd, 1, j))
+      else:
+        if d > drone_dist[n]:
+          continue
+        if owner[n] == None:
+          # every drone nobody has yet leads on to the end of the search
+          heapq.heappush(queue, (d + drone_potential[n], 2, n))
+          continue
+        # a placed drone can be handed back to its task for the cost it was placed at
+        i = owner[n]
+        nd = d - costs[i][n] + drone_potential[n] - task_potential[i]
+        if not i in task_dist or nd < task_dist[i]:
+          task_dist[i] = nd
+          handed_back[i] = n
+          heapq.heappush(queue, (nd, 0, i))
+
+    if end == None:
+      break
+
+    # shift every drone along the path over to the task that reached it
+    j = end[1]
+    while True:
+      i = came_from[j]
+      owner[j] = i
+      if not i in handed_back:
+        left[i] -= 1
+        break
+      j = handed_back[i]
+
+    # keeps the reduced costs from going negative next round
+    # only nodes the search got closer to than the end move, everything else is as far as the end anyway
+    reached = end[0]
+    for i, d in task_dist.items():
+      if d < reached:
+        task_potential[i] += d - reached
+    for j, d in drone_dist.items():
+      if d < reached:
+        drone_potential[j] += d - reached
+
+  return owner
@@ -0,0 +1,84 @@
+# times euclid's Vector2 operators and bullseye's intercept math with the checked operators and the fast path ones
+# bullseye normally does its math with vector.Vector2, which is timed alongside
+#   python wedge/bench/bench_euclid.py [rounds]
+import os
+import sys
+import time
+import random
+import __builtin__
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# bullseye loads euclid through dmangame's require_dependency, this does the same outside the game
+def require_dependency(module_name):
+  sys._getframe(1).f_globals[module_name] = __import__(module_name)
+__builtin__.require_dependency = require_dependency
+
+import euclid
+import bullseye
+import vector
+from euclid import Vector2
+
+ENEMIES = 50
+SHOOTERS = 50
+SIZE = 500
+BULLET_SPEED = 8
+
+# stands in for a dmangame unit, just enough for Predictor
+class Enemy(object):
+  def __init__(self, position):
+    self.position = position
+
+def time_ops(rounds, Vector2):
+  random.seed(1)
+  vectors = [ Vector2(random.randint(0, SIZE), random.randint(0, SIZE)) for i in range(1000) ]
+  pairs = zip(vectors, vectors[1:])
+
+  began = time.time()
+  for r in range(rounds):
+    for v, w in pairs:
+      v + w
+      v - w
+      v * 2
+      v == w
+  return time.time() - began
+
+# every shooter aims at every enemy, as 50 units fighting 50 enemies would
+def time_intercepts(rounds, Vector2):
+  bullseye.Vector2 = Vector2
+  random.seed(2)
+  predictors = []
+  for i in range(ENEMIES):
+    enemy = Enemy( (random.randint(0, SIZE - 1), random.randint(0, SIZE - 1)) )
+    p = bullseye.Predictor(enemy, SIZE)
+    p.set_position( (enemy.position[0] + random.randint(-3, 3), enemy.position[1] + random.randint(-3, 3)) )
+    predictors.append(p)
+  shooters = [ (random.randint(0, SIZE - 1), random.randint(0, SIZE - 1)) for i in range(SHOOTERS) ]
+
+  began = time.time()
+  for r in range(rounds):
+    for p in predictors:
+      for s in shooters:
+        p.solve(s, BULLET_SPEED)
+  took = time.time() - began
+
+  bullseye.Vector2 = vector.Vector2
+  return took
+
+def main():
+  rounds = 20
+  if len(sys.argv) > 1:
+    rounds = int(sys.argv[1])
+
+  print("%d rounds, seconds" % rounds)
+  print("%-28s%12s%12s%10s%12s" % ("", "checked", "fast", "speedup", "vector"))
+  for name, runner in [ ("vector2 + - * ==", time_ops), ("%dx%d intercepts" % (SHOOTERS, ENEMIES), time_intercepts) ]:
+    euclid.use_fast_ops(False)
+    checked = runner(rounds, Vector2)
+    euclid.use_fast_ops(True)
+    fast = runner(rounds, Vector2)
+    core = runner(rounds, vector.Vector2)
+    print("%-28s%12.3f%12.3f%9.2fx%12.3f" % (name, checked, fast, checked / fast, core))
+
+if __name__ == "__main__":
+  main()
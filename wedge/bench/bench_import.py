@@ -0,0 +1,52 @@
+# times a cold start of bullseye, each import in a fresh interpreter as a new match would have
+# bullseye loads euclid and numpy the first time predict_many() needs them, the other rows are what loading them up front costs
+#   python wedge/bench/bench_import.py [runs]
+import os
+import sys
+import time
+import subprocess
+
+WEDGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# bullseye loads its modules through dmangame's require_dependency, this does the same outside the game
+SETUP = """
+import sys
+import __builtin__
+sys.path.append(%r)
+def require_dependency(module_name):
+  sys._getframe(1).f_globals[module_name] = __import__(module_name)
+__builtin__.require_dependency = require_dependency
+""" % WEDGE
+
+CASES = [
+  ("bullseye", "import bullseye"),
+  ("bullseye and numpy", "import bullseye; bullseye.load_numpy()"),
+  ("bullseye and euclid", "import bullseye; bullseye.load_euclid()"),
+]
+
+# median seconds to run code in a new interpreter
+def cold(code, runs):
+  took = []
+  for i in range(runs):
+    began = time.time()
+    subprocess.check_call( [sys.executable, "-c", SETUP + code] )
+    took.append(time.time() - began)
+
+  took.sort()
+  return took[len(took) // 2]
+
+def main():
+  runs = 30
+  if len(sys.argv) > 1:
+    runs = int(sys.argv[1])
+
+  # compile everything once so every timed run reads the same .pyc files
+  cold(CASES[-1][1], 1)
+
+  empty = cold("", runs)
+  print("median of %d runs, milliseconds over an empty interpreter (%.1f)" % (runs, empty * 1000))
+  for name, code in CASES:
+    print("%-24s%8.2f" % (name, (cold(code, runs) - empty) * 1000))
+
+if __name__ == "__main__":
+  main()
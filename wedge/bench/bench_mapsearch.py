@@ -0,0 +1,134 @@
+# times the MapSearch modes against the original list implementation
+# run from a dmangame checkout so ai.py and world.py can be imported:
+#   PYTHONPATH=path/to/dmangame python wedge/bench/bench_mapsearch.py [turns]
+import os
+import sys
+import time
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import mapsearch
+from wedgeutil import calc_distance
+
+SIZES = [100, 250, 500, 1000, 2000]
+SIGHT = 20
+DRONES = 40
+
+# stands in for a dmangame unit, just enough for MapSearch
+class Drone(object):
+  def __init__(self, position):
+    self.position = position
+
+  def calcDistance(self, p):
+    return ((self.position[0] - p[0]) ** 2 + (self.position[1] - p[1]) ** 2) ** 0.5
+
+# the list based MapSearch the other modes replaced, kept here as the baseline
+class ListMapSearch(object):
+  def __init__(self):
+    self.points = []
+
+  def setup(self, size, sight):
+    self.range = sight * 0.5
+    start = int(sight / 2)
+    for y in range(start, size, sight):
+      for x in range(start, size, sight):
+        self.points.append( (x,y) )
+
+  def nearest(self, position):
+    if len(self.points) == 0:
+      return None
+
+    distances = {}
+    for p in self.points:
+      distances[p] = calc_distance(p, position)
+
+    return sorted( distances.items(), key = lambda x: x[1] )[0][0]
+
+  def update(self, units):
+    for p in self.points[:]:
+      for unit in units:
+        if unit.calcDistance(p) < self.range:
+          self.points.remove(p)
+          break
+
+# plays out a number of turns, every drone jumps to the point it was handed and explores it
+def run(search, size, turns):
+  random.seed(size)
+  drones = [ Drone( (random.randint(0, size - 1), random.randint(0, size - 1)) ) for i in range(DRONES) ]
+
+  began = time.time()
+  search.setup(size, SIGHT)
+  for turn in range(turns):
+    search.update(drones)
+    for drone in drones:
+      point = search.nearest(drone.position)
+      if point != None:
+        drone.position = point
+
+  return time.time() - began, len(search.points)
+
+# late game, only a few scattered points are left unexplored
+# times the nearest() queries alone
+def run_sparse(search, size, turns, left = 0.03):
+  random.seed(size)
+  search.setup(size, SIGHT)
+
+  if isinstance(search, ListMapSearch):
+    search.points = [ p for p in search.points if random.random() < left ]
+  else:
+    for i in range(search.lattice.count):
+      if random.random() >= left:
+        search.explore(i)
+
+  drones = [ (random.randint(0, size - 1), random.randint(0, size - 1)) for i in range(DRONES * turns) ]
+
+  began = time.time()
+  for position in drones:
+    search.nearest(position)
+
+  return time.time() - began, len(search.points)
+
+# drones that just spawned, standing around one building, each handed its own point
+# times the nearest_many() calls alone, nothing gets explored
+def run_batch(search, size, turns, drones = 150):
+  random.seed(size)
+  search.setup(size, SIGHT)
+
+  spot = (random.randint(0, size - 1), random.randint(0, size - 1))
+  positions = [ (spot[0] + random.uniform(-5, 5), spot[1] + random.uniform(-5, 5)) for i in range(drones) ]
+
+  began = time.time()
+  for turn in range(turns):
+    search.nearest_many(positions)
+
+  return time.time() - began, len(search.points)
+
+def table(title, runner, modes, turns):
+  print(title)
+  print("%-6s" % "map" + "".join([ "%18s" % name for name, cls in modes ]))
+  for size in SIZES:
+    line = "%-6d" % size
+    for name, cls in modes:
+      took, left = runner(cls(), size, turns)
+      line += "%18s" % ("%.3f (%d)" % (took, left))
+    print(line)
+  print("")
+
+def main():
+  turns = 30
+  if len(sys.argv) > 1:
+    turns = int(sys.argv[1])
+
+  modes = [ ("list", ListMapSearch), ("rings", mapsearch.MapSearch), ("quadtree", mapsearch.QuadMapSearch) ]
+  if mapsearch.load_numpy() != None:
+    modes.append( ("numpy", mapsearch.ArrayMapSearch) )
+
+  print("%d drones, sight %d, %d turns, seconds (points left)" % (DRONES, SIGHT, turns))
+  print("")
+  table("exploring from the start", run, modes, turns)
+  table("nearest() with 3% of the points left", run_sparse, modes, turns)
+  table("nearest_many() for 150 drones within 5 of one spot", run_batch, modes[1:], turns)
+
+if __name__ == "__main__":
+  main()
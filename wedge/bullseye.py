@@ -1,20 +1,65 @@
-require_dependency( module_name = "euclid" )
+require_dependency( module_name = "vector" )
 
-from euclid import *
+import math
+from collections import OrderedDict
+from vector import Vector2
+
+# euclid is only loaded once solve_many() needs its Vector2Array, see load_euclid()
+euclid = None
+
+def load_euclid():
+	global euclid
+	if euclid == None:
+		require_dependency( module_name = "euclid" )
+	
+	return euclid
+
+# numpy is optional, predict_many() solves one target at a time without it
+# it takes longer to import than the rest of bullseye, so it is only loaded once solve_many() runs, see load_numpy()
+numpy = None
+numpy_checked = False
+
+# returns numpy, or None when it isn't installed
+def load_numpy():
+	global numpy, numpy_checked
+	if not numpy_checked:
+		numpy_checked = True
+		try:
+			import numpy
+		except ImportError:
+			numpy = None
+	
+	return numpy
 
 class Predictor(object):
+	# shooters in the same cell share one aim point, units stand on whole squares so 1 keeps every aim exact
+	cell = 1
+	
 	def __init__(self, target, size):
 		self.target = target
 		self.last = Vector2(target.position[0], target.position[1])
 		self.current = self.last
 		self.mapsize = size
+		self.aims = {}	# aim points worked out since the target last moved, by aim_key()
 
 	def set_position(self, pos):
 		self.last = self.current
 		self.current = Vector2(pos[0], pos[1])
-				
+		self.aims = {}
+	
+	def aim_key(self, fire_from, bullet_speed):
+		return ( int(fire_from[0] // self.cell), int(fire_from[1] // self.cell), bullet_speed )
+	
 	# returns a predicted position for the target
+	# repeat shots from the same cell are looked up rather than solved again
 	def predict(self, fire_from, bullet_speed):
+		key = self.aim_key(fire_from, bullet_speed)
+		if not key in self.aims:
+			self.aims[key] = self.solve(fire_from, bullet_speed)
+		
+		return self.aims[key]
+	
+	def solve(self, fire_from, bullet_speed):
 		
 		if self.current == self.last:
 			return ( self.current.x, self.current.y )
@@ -29,18 +74,78 @@ class Predictor(object):
 		if i == None:
 			return self.target.position
 		else:
-			# make sure the position is valid
-			clean_i = list(i)
-			if clean_i[0] < 0:
-				clean_i[0] = 0
-			if clean_i[0] > self.mapsize:
-				clean_i[0] = self.mapsize
-			if clean_i[1] < 0:
-				clean_i[1] = 0
-			if clean_i[1] > self.mapsize:
-				clean_i[1] = self.mapsize
-			
-			return clean_i
+			return self.clamp(i)
+	
+	# make sure the position is valid
+	def clamp(self, i):
+		clean_i = list(i)
+		if clean_i[0] < 0:
+			clean_i[0] = 0
+		if clean_i[0] > self.mapsize:
+			clean_i[0] = self.mapsize
+		if clean_i[1] < 0:
+			clean_i[1] = 0
+		if clean_i[1] > self.mapsize:
+			clean_i[1] = self.mapsize
+		
+		return clean_i
+	
+	# predict() for many shots at once, shooters[i] is the position firing at the target of predictor enemies[i]
+	@staticmethod
+	def predict_many(shooters, enemies, bullet_speed):
+		keys = [ e.aim_key(s, bullet_speed) for s, e in zip(shooters, enemies) ]
+		todo = [ i for i, e in enumerate(enemies) if not keys[i] in e.aims ]
+		
+		aims = Predictor.solve_many( [shooters[i] for i in todo], [enemies[i] for i in todo], bullet_speed )
+		for i, aim in zip(todo, aims):
+			enemies[i].aims[ keys[i] ] = aim
+		
+		return [ e.aims[key] for e, key in zip(enemies, keys) ]
+	
+	# solve() for many shots at once, every intercept is solved in one pass over arrays
+	# without numpy each shot goes through solve()
+	@staticmethod
+	def solve_many(shooters, enemies, bullet_speed):
+		if len(enemies) == 0 or load_numpy() == None:
+			return [ e.solve(s, bullet_speed) for s, e in zip(shooters, enemies) ]
+		
+		Vector2Array = load_euclid().Vector2Array
+		src = Vector2Array.from_vectors(shooters)
+		current = Vector2Array.from_vectors( [e.current for e in enemies] )
+		v = current - Vector2Array.from_vectors( [e.last for e in enemies] )
+		
+		# the same quadratic intersect() solves
+		tx = current - src
+		a = v.magnitude_squared() - bullet_speed * bullet_speed
+		b = 2 * v.dot(tx)
+		c = tx.magnitude_squared()
+		
+		# targets that stand still, and the nearly linear cases, are rare enough to leave to solve()
+		single = ( (v.x == 0) & (v.y == 0) ) | (numpy.abs(a) < 1E-6)
+		
+		disc = b * b - 4 * a * c
+		solved = disc >= 0
+		disc = numpy.sqrt( numpy.where(solved, disc, 0) )
+		a = 2 * numpy.where(single, 1, a)
+		t0 = (-b - disc) / a
+		t1 = (-b + disc) / a
+		
+		t = numpy.minimum(t0, t1)
+		t = numpy.where(t < 0, numpy.maximum(t0, t1), t)
+		hit = solved & (t > 0)
+		x = current.x + v.x * t
+		y = current.y + v.y * t
+		
+		found = []
+		for i, e in enumerate(enemies):
+			if single[i]:
+				found.append( e.solve(shooters[i], bullet_speed) )
+			elif hit[i]:
+				found.append( e.clamp( (int(x[i]), int(y[i])) ) )
+			else:
+				found.append( e.target.position )
+		
+		return found
 		
 	# src = position we are firing from
 	# target = position of target currently
@@ -89,3 +194,67 @@ class Predictor(object):
 				sol = ( (-b - disc) / a, (-b + disc) / a )
 				
 		return sol 
+
+# keeps track of enemy positions for Predictors, remembering at most cap enemies
+# each enemy is one (last x, last y, current x, current y) tuple in a flat list
+# when full, the enemies that have gone unseen the longest are forgotten first
+class Predictors(object):
+	def __init__(self, size, cap = 200):
+		self.mapsize = size
+		self.cap = cap
+		self.rows = OrderedDict()	# self.rows[enemy] = index into self.data, least recently seen first
+		self.data = []
+		self.free = []	# rows of forgotten enemies, reused before the list grows
+		self.views = {}	# Predictors handed out this turn
+	
+	def __len__(self):
+		return len(self.rows)
+	
+	def __contains__(self, enemy):
+		return enemy in self.rows
+	
+	# a Predictor for the enemy, built from its row and kept until the next update()
+	def __getitem__(self, enemy):
+		if not enemy in self.rows:
+			self.see(enemy)
+		
+		p = self.views.get(enemy)
+		if p == None:
+			lx, ly, x, y = self.data[ self.rows[enemy] ]
+			p = Predictor(enemy, self.mapsize)
+			p.last = Vector2(lx, ly)
+			p.current = Vector2(x, y)
+			self.views[enemy] = p
+		
+		return p
+	
+	# call once a turn with every visible enemy
+	def update(self, enemies):
+		self.views = {}
+		
+		seen = 0
+		for enemy in enemies:
+			self.see(enemy)
+			seen += 1
+		
+		# never forget an enemy seen this turn, even when more than cap are visible
+		while len(self.rows) > max(self.cap, seen):
+			enemy, row = self.rows.popitem(last = False)
+			self.data[row] = None
+			self.free.append(row)
+	
+	def see(self, enemy):
+		x, y = enemy.position[0], enemy.position[1]
+		
+		if enemy in self.rows:
+			row = self.rows.pop(enemy)
+			self.data[row] = self.data[row][2:] + (x, y)
+		elif len(self.free) > 0:
+			row = self.free.pop()
+			self.data[row] = (x, y, x, y)
+		else:
+			row = len(self.data)
+			self.data.append( (x, y, x, y) )
+		
+		self.rows[enemy] = row
+		self.views.pop(enemy, None)
@@ -5,6 +5,9 @@ from collections import defaultdict
 import itertools
 AIClass="WedgeClassic"
 import logging
+
+require_dependency(module_name = "wedgeutil")
+
 log = logging.getLogger(AIClass)
 
 class Base(object):
@@ -133,13 +136,7 @@ class WedgeClassic(ai.AI):
         unit.move(self.position_on_circle(self.wander_radius, unit.position[0], unit.position[1]))
 
     def position_on_circle(self, radius, cx, cy):
-      x,y = -1,-1
-
-      while(self.valid_position(x,y) == False):
-        angle = random.randint(0,360)
-        x = cx + radius * math.sin(angle)
-        y = cy + radius * math.cos(angle)
-      return (x,y)        
+      return wedgeutil.radian_arcs.sample(radius, (cx, cy), self.mapsize)
 
     def valid_position(self, x, y):
       if x < 0:
@@ -32,6 +32,14 @@ __revision__ = '$Revision$'
 import math
 import operator
 import types
+import array
+
+# Vector2Array keeps its components in numpy arrays when numpy is installed,
+# and in array('d') buffers otherwise.
+try:
+    import numpy as _numpy
+except ImportError:
+    _numpy = None
 
 # Some magic here.  If _use_slots is True, the classes will derive from
 # object and will define a __slots__ class variable.  If _use_slots is
@@ -49,6 +57,13 @@ _use_slots = True
 # well.  Recommended setting is False.
 _enable_swizzle_set = False
 
+# If True, Vector2 +, - and == between two vectors of the same class, and *
+# by an int, long or float, skip the isinstance checks and asserts.  Any
+# other operands fall back to the checked methods.  Swizzle reads such as
+# v.yx are not available in this mode.  Off by default, switch it on (or
+# off again) at run time with use_fast_ops().
+_fast_ops = False
+
 # Requires class to derive from object.
 if _enable_swizzle_set:
     _use_slots = True
@@ -303,6 +318,217 @@ class Vector2:
         n = other.normalized()
         return self.dot(n)*n
 
+# Fast path operators, see _fast_ops
+# ---------------------------------------------------------------------------
+
+_checked_ops = {}
+for _name in ('__add__', '__sub__', '__mul__', '__rmul__', '__eq__',
+              '__getattr__'):
+    _checked_ops[_name] = Vector2.__dict__[_name]
+
+def _fast_add(self, other):
+    if self.__class__ is other.__class__:
+        return Vector2(self.x + other.x,
+                       self.y + other.y)
+    return _checked_ops['__add__'](self, other)
+
+def _fast_sub(self, other):
+    if self.__class__ is other.__class__:
+        return Vector2(self.x - other.x,
+                       self.y - other.y)
+    return _checked_ops['__sub__'](self, other)
+
+def _fast_mul(self, other):
+    if type(other) in (int, long, float):
+        return Vector2(self.x * other,
+                       self.y * other)
+    return _checked_ops['__mul__'](self, other)
+
+def _fast_eq(self, other):
+    if self.__class__ is other.__class__:
+        return self.x == other.x and \
+               self.y == other.y
+    return _checked_ops['__eq__'](self, other)
+
+def use_fast_ops(enabled=True):
+    '''Switch Vector2 between the fast path operators and the checked ones.'''
+    global _fast_ops
+    _fast_ops = enabled
+
+    ops = dict(_checked_ops)
+    if enabled:
+        ops.update({'__add__': _fast_add,
+                    '__sub__': _fast_sub,
+                    '__mul__': _fast_mul,
+                    '__rmul__': _fast_mul,
+                    '__eq__': _fast_eq})
+        del ops['__getattr__']
+        if '__getattr__' in Vector2.__dict__:
+            delattr(Vector2, '__getattr__')
+
+    for name, op in ops.items():
+        setattr(Vector2, name, op)
+
+use_fast_ops(_fast_ops)
+
+# Struct-of-arrays vectors
+# ---------------------------------------------------------------------------
+
+def _buffer(values):
+    if _numpy is not None:
+        return _numpy.array(values, dtype=float)
+    return array.array('d', values)
+
+def _combine(op, a, b):
+    # a is a buffer, b is a buffer of the same length or a single number
+    if _numpy is not None:
+        return op(a, b)
+    if isinstance(b, (int, long, float)):
+        return array.array('d', [op(p, b) for p in a])
+    return array.array('d', map(op, a, b))
+
+def _clamp(a, low, high):
+    # low or high may be None for no limit on that side
+    if _numpy is not None:
+        # older numpy refuses to clip with neither limit
+        if low is None and high is None:
+            return a
+        return _numpy.clip(a, low, high)
+    if low is not None:
+        a = array.array('d', [max(p, low) for p in a])
+    if high is not None:
+        a = array.array('d', [min(p, high) for p in a])
+    return a
+
+def _at_most(a, b):
+    # b is a buffer of the same length as a or a single number
+    if _numpy is not None:
+        return a <= b
+    if isinstance(b, (int, long, float)):
+        return [p <= b for p in a]
+    return [p <= q for p, q in zip(a, b)]
+
+class Vector2Array:
+    '''Many Vector2s held as two buffers of floats, x and y.
+
+    Arithmetic works on every vector at once. The other operand can be a
+    Vector2Array of the same length, or a single Vector2 or (x, y) pair
+    that is applied to every vector.
+    '''
+    __slots__ = ['x', 'y']
+    __hash__ = None
+
+    def __init__(self, x=(), y=()):
+        assert len(x) == len(y)
+        self.x = _buffer(x)
+        self.y = _buffer(y)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        vectors = list(vectors)
+        return cls([v[0] for v in vectors],
+                   [v[1] for v in vectors])
+
+    @classmethod
+    def zeros(cls, n):
+        return cls([0.0] * n, [0.0] * n)
+
+    def __copy__(self):
+        return self.__class__(self.x, self.y)
+
+    copy = __copy__
+
+    def __repr__(self):
+        return 'Vector2Array(%d)' % len(self)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, key):
+        return Vector2(float(self.x[key]), float(self.y[key]))
+
+    def __setitem__(self, key, value):
+        self.x[key] = value[0]
+        self.y[key] = value[1]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _components(self, other):
+        if isinstance(other, Vector2Array):
+            assert len(other) == len(self)
+            return other.x, other.y
+        assert hasattr(other, '__len__') and len(other) == 2
+        return float(other[0]), float(other[1])
+
+    def _new(self, x, y):
+        v = Vector2Array()
+        v.x = x
+        v.y = y
+        return v
+
+    def __add__(self, other):
+        x, y = self._components(other)
+        return self._new(_combine(operator.add, self.x, x),
+                         _combine(operator.add, self.y, y))
+
+    __radd__ = __add__
+
+    def __iadd__(self, other):
+        x, y = self._components(other)
+        self.x = _combine(operator.add, self.x, x)
+        self.y = _combine(operator.add, self.y, y)
+        return self
+
+    def __sub__(self, other):
+        x, y = self._components(other)
+        return self._new(_combine(operator.sub, self.x, x),
+                         _combine(operator.sub, self.y, y))
+
+    def __rsub__(self, other):
+        x, y = self._components(other)
+        return self._new(_combine(operator.sub, self.x, x),
+                         _combine(operator.sub, self.y, y)).__neg__()
+
+    def __isub__(self, other):
+        x, y = self._components(other)
+        self.x = _combine(operator.sub, self.x, x)
+        self.y = _combine(operator.sub, self.y, y)
+        return self
+
+    def __mul__(self, other):
+        """Scale by a number, or each vector by its entry in a sequence"""
+        if not isinstance(other, (int, long, float)):
+            other = _buffer(other)
+            assert len(other) == len(self)
+        return self._new(_combine(operator.mul, self.x, other),
+                         _combine(operator.mul, self.y, other))
+
+    __rmul__ = __mul__
+    scale = __mul__
+
+    def __neg__(self):
+        return self * -1.0
+
+    def dot(self, other):
+        """Return the dot product of each vector with other"""
+        x, y = self._components(other)
+        return _combine(operator.add,
+                        _combine(operator.mul, self.x, x),
+                        _combine(operator.mul, self.y, y))
+
+    def magnitude_squared(self):
+        return self.dot(self)
+
+    def magnitude(self):
+        m = self.magnitude_squared()
+        if _numpy is not None:
+            return _numpy.sqrt(m)
+        return array.array('d', [math.sqrt(p) for p in m])
+
+    __abs__ = magnitude
+
 # Geometry
 # Much maths thanks to Paul Bourke, http://astronomy.swin.edu.au/~pbourke
 # ---------------------------------------------------------------------------
@@ -529,6 +755,9 @@ class Line2(Geometry):
     def _u_in(self, u):
         return True
 
+    # the range of u covered, None where it is unbounded
+    _u_bounds = (None, None)
+
     def intersect(self, other):
         return other._intersect_line2(self)
 
@@ -550,6 +779,40 @@ class Line2(Geometry):
     def _connect_circle(self, other):
         return _connect_circle_line2(other, self)
 
+    # Batch tests against many points at once.  points can be a
+    # Vector2Array or a sequence of (x, y) pairs; results are numpy arrays
+    # when numpy is installed, and array('d') buffers or lists otherwise.
+
+    def _offsets(self, points):
+        # from the closest point of the line to each of points
+        if not isinstance(points, Vector2Array):
+            points = Vector2Array.from_vectors(points)
+        d = points - self.p
+        u = _combine(operator.mul, d.dot(self.v),
+                     1.0 / self.v.magnitude_squared())
+        u = _clamp(u, self._u_bounds[0], self._u_bounds[1])
+        return d._new(_combine(operator.sub, d.x, _combine(operator.mul, u, self.v.x)),
+                      _combine(operator.sub, d.y, _combine(operator.mul, u, self.v.y)))
+
+    def distance_to_points(self, points):
+        """Return the distance from the line to each of points"""
+        return self._offsets(points).magnitude()
+
+    def intersect_points(self, points, tolerance=0.0):
+        """Return whether each of points lies within tolerance of the line"""
+        return _at_most(self._offsets(points).magnitude_squared(),
+                        float(tolerance) ** 2)
+
+    def intersect_circles(self, centers, radii):
+        """Return whether the line meets each circle, given by its center
+        and either one radius for all of them or a radius each"""
+        if isinstance(radii, (int, long, float)):
+            radii = float(radii) ** 2
+        else:
+            radii = _buffer(radii)
+            radii = _combine(operator.mul, radii, radii)
+        return _at_most(self._offsets(centers).magnitude_squared(), radii)
+
 class Ray2(Line2):
     def __repr__(self):
         return 'Ray2(<%.2f, %.2f> + u<%.2f, %.2f>)' % \
@@ -558,6 +821,8 @@ class Ray2(Line2):
     def _u_in(self, u):
         return u >= 0.0
 
+    _u_bounds = (0.0, None)
+
 class LineSegment2(Line2):
     def __repr__(self):
         return 'LineSegment2(<%.2f, %.2f> to <%.2f, %.2f>)' % \
@@ -566,6 +831,8 @@ class LineSegment2(Line2):
     def _u_in(self, u):
         return u >= 0.0 and u <= 1.0
 
+    _u_bounds = (0.0, 1.0)
+
     def __abs__(self):
         return abs(self.v)
 
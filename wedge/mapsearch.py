@@ -1,93 +1,554 @@
 import ai
 import operator
+import heapq
 import sys
 import os
 sys.path.append(os.path.dirname(__file__))
 
 from wedgeutil import calc_distance
 from wedgeutil import closest_thing
+from wedgeutil import load_numpy
+
+# numpy is optional, it is only needed by ArrayMapSearch and is loaded when the first one is made
+numpy = None
+
+# lattices shared by every MapSearch in this process, keyed by (mapsize, sight)
+# a lattice never changes once built, so AIs playing on the same map can all use the same one
+lattices = {}
+
+def lattice(size, sight):
+  key = (size, sight)
+  if not key in lattices:
+    lattices[key] = Lattice(size, sight)
+  return lattices[key]
+
+# the points our units search, laid out on a regular grid one sight apart
+# each cell of the grid holds exactly one point, cells are numbered row by row
+# points are never stored, they are worked out from their cell index
+class Lattice(object):
+    def __init__(self, size, sight):
+      self.size = size
+      self.sight = sight
+      self.range = sight * 0.5 # how far away do units have to be before they are considered to have explored a point?
+      self.start = int(sight / 2) # coordinate of the first point on each axis
+      self.cols = max(0, (size - self.start + sight - 1) // sight) # number of points on each axis
+      self.count = self.cols * self.cols
+
+      # neighbor index, (col, row) offsets of the cells around a unit's own cell that it could explore
+      reach = int(self.range / sight) + 1
+      self.cover = [ (x, y) for y in range(-reach, reach + 1) for x in range(-reach, reach + 1) ]
+
+    # index of the cell holding the point at p
+    def index(self, p):
+      return int((p[1] - self.start) / self.sight) * self.cols + int((p[0] - self.start) / self.sight)
+
+    # the point in cell i
+    def point(self, i):
+      return ( self.start + (i % self.cols) * self.sight, self.start + (i // self.cols) * self.sight )
+
+    # (col, row) of the cell closest to position, clamped to the lattice
+    def cell(self, position):
+      col = int(round( (position[0] - self.start) / float(self.sight) ))
+      row = int(round( (position[1] - self.start) / float(self.sight) ))
+      return ( min(max(col, 0), self.cols - 1), min(max(row, 0), self.cols - 1) )
+
+    # yields the indexes of all cells exactly r rings away from (col, row)
+    def ring(self, col, row, r):
+      if r == 0:
+        yield row * self.cols + col
+        return
+
+      last = self.cols - 1
+      left, right = max(col - r, 0), min(col + r, last)
+
+      if row - r >= 0:
+        base = (row - r) * self.cols
+        for x in range(left, right + 1):
+          yield base + x
+      if row + r <= last:
+        base = (row + r) * self.cols
+        for x in range(left, right + 1):
+          yield base + x
+
+      for y in range( max(row - r + 1, 0), min(row + r - 1, last) + 1 ):
+        if col - r >= 0:
+          yield y * self.cols + col - r
+        if col + r <= last:
+          yield y * self.cols + col + r
+
+    # yields the indexes of the cells a unit at position could explore
+    def near(self, position):
+      col, row = self.cell(position)
+      for x, y in self.cover:
+        if 0 <= col + x < self.cols and 0 <= row + y < self.cols:
+          yield (row + y) * self.cols + col + x
 
 
 # MapSearch creates a list of points for our units to search
 # AI can call nearest(position_of_unit) and get a point to travel to
-# nearest() weights the points based off of distance from unit and distance from buildings
+# nearest() weights the closest points based off of distance from unit and distance from buildings
+# the points come from a shared Lattice, a MapSearch only records which of them have been explored
 class MapSearch(object):
     def __init__(self):
       self.mapsize = 10000  # size of map
       self.sight = 20       # how far can our units see?
-      self.range = self.sight # how far away do units have to be before they are considered to have explored a point?      
+      self.range = self.sight # how far away do units have to be before they are considered to have explored a point?
+
+      self.points = LatticePoints(self) # (x,y) coords we need to explore
+      self.distances = {}   # each dictionary entry is a heap of the points ordered by distance from a building
+                            # self.distances[building] = [(distance, cell index), ...], or None until nearest_to_building() needs it
+                            # explored points stay in the heap until they reach the top
+
+      self.lattice = lattice(0, self.sight) # replaced by setup()
+      self.explored = bytearray() # bitmask, bit i is set once the point in cell i has been explored
+      self.remaining = 0    # number of unexplored points
+      self.leftover = None  # set of the unexplored points, only built once few are left, see k_nearest()
+
+      # weighting for nearest()
+      self.candidates = 5   # how many of the closest points nearest() weighs
+      self.sites = []       # positions of the known buildings in the order they were added
+      self.field = {}       # self.field[i] = (distance from the point in cell i to the closest building, number of sites checked)
+                            # only filled in for points nearest() has weighed
 
-      self.points = []      # (x,y) coords we need to explore
-      self.distances = {}   # each dictionary entry contain the distances from a building to all points
-                            # self.distances[building][point] = distance
-      
     def setup(self, size, sight):
       self.mapsize = size
       self.sight = sight
-      self.range = self.sight * 0.5
 
-      start = int(self.sight / 2)
-      for y in range(start, self.mapsize, self.sight):
-        for x in range(start, self.mapsize, self.sight):
-          self.points.append( (x,y) )
+      self.lattice = lattice(size, sight)
+      self.range = self.lattice.range
+      self.remaining = self.lattice.count
+      self.leftover = None
+      self.reset()
+
+    # marks every point unexplored
+    def reset(self):
+      self.explored = bytearray( (self.lattice.count + 7) // 8 )
+
+    def index(self, p):
+      return self.lattice.index(p)
+
+    def point(self, i):
+      return self.lattice.point(i)
+
+    def cell(self, position):
+      return self.lattice.cell(position)
+
+    # returns up to k unexplored points ordered by distance to position, ties go to the earlier point in row order
+    # skip is a set of cell indexes to pass over as if they were explored
+    def k_nearest(self, position, k, skip = ()):
+      if self.remaining == 0 or k <= 0:
+        return []
+
+      # when few points are left the rings are mostly empty, scanning the leftovers is cheaper
+      # points only ever get explored so once this is true it stays true
+      if self.remaining ** 2 <= self.lattice.count:
+        if self.leftover is None:
+          self.leftover = set(self.points)
+
+        found = [ (calc_distance(p, position), self.index(p), p) for p in self.leftover ]
+        if len(skip) > 0:
+          found = [ f for f in found if not f[1] in skip ]
+        return [ f[2] for f in heapq.nsmallest(k, found) ]
+
+      lattice = self.lattice
+      explored = self.explored
+      col, row = lattice.cell(position)
+
+      # any point r rings out is at least r * sight - offset away from position
+      offset = max( abs(lattice.start + col * lattice.sight - position[0]), abs(lattice.start + row * lattice.sight - position[1]) )
+      max_r = max(col, row, lattice.cols - 1 - col, lattice.cols - 1 - row)
 
-    # looks at 4 closest points to position & adds distance to closest building
-    # returns point with combined distance closest to position
+      found = [] # max heap of the best k so far as (-distance, -index, point)
+      for r in range(0, max_r + 1):
+        if len(found) == k and r * lattice.sight - offset > -found[0][0]:
+          break
+
+        for i in lattice.ring(col, row, r):
+          if explored[i >> 3] & (1 << (i & 7)) or i in skip:
+            continue
+
+          p = lattice.point(i)
+          entry = ( -calc_distance(p, position), -i, p )
+          if len(found) < k:
+            heapq.heappush(found, entry)
+          elif entry > found[0]:
+            heapq.heapreplace(found, entry)
+
+      return [ f[2] for f in sorted(found, reverse = True) ]
+
+    # distance from position to p plus distance from p to the closest known building
+    # a point's building distance is cached and only checked against buildings added since it was last weighed
+    def score(self, p, position):
+      d = calc_distance(p, position)
+      if len(self.sites) == 0:
+        return d
+
+      i = self.index(p)
+      closest, checked = self.field.get(i, (None, 0))
+      if checked < len(self.sites):
+        for site in self.sites[checked:]:
+          site_d = calc_distance(p, site)
+          if closest is None or site_d < closest:
+            closest = site_d
+        self.field[i] = (closest, len(self.sites))
+
+      return d + closest
+
+    # looks at the closest points & adds their distance to the closest building
+    # returns the point with the lowest combined distance
     def nearest(self, position):
-      if len(self.points) == 0:
+      found = self.k_nearest(position, self.candidates)
+      if len(found) == 0:
         return None
 
-      # calc distances to our position
-      distances = {}
-      
-      for p in self.points:
-        distances[p] = calc_distance( p, position )
+      return min( found, key = lambda p: self.score(p, position) )
+
+    # returns a point for each position, like calling nearest() for each one
+    # except no two positions are handed the same point while there are enough points to go around
+    def nearest_many(self, positions):
+      found = [None] * len(positions)
+      if len(self.points) == 0:
+        return found
 
-        # if the point we just checked is within the units sight range, return this point immediately
-        # this makes for a speedier algorithm also less exact
-        #if distances[p] < self.sight:
-        #  return p
+      # every position weighs its closest points once, the lowest scoring position/point pairs are settled first
+      # spread out drones all get a point here
+      pairs = []
+      for n, position in enumerate(positions):
+        for rank, p in enumerate(self.k_nearest(position, self.candidates)):
+          pairs.append( (self.score(p, position), n, rank, p) )
 
-      sorted_d = sorted( distances.items(), key = lambda x: x[1] )
+      pairs.sort()
+      taken = set() # cell indexes of the points handed out
+      for d, n, rank, p in pairs:
+        if found[n] == None and not self.index(p) in taken:
+          found[n] = p
+          taken.add( self.index(p) )
 
-      building_found = closest_thing( position, self.distances.keys() )
+      # drones standing together want the same points, those left over pick in turn the way nearest() would
+      # if the points handed out so far were explored
+      for n, position in enumerate(positions):
+        if found[n] != None:
+          continue
 
-      if building_found == None:
-        return sorted_d[0][0]
+        free = self.k_nearest(position, self.candidates, taken)
+        if len(free) == 0:
+          break
 
-      sorted_d = list(sorted_d[0:5]) # take first four sorted points
-      
-      for i in range( 0, len(sorted_d) ):
-        sorted_d[i] = list(sorted_d[i])
-        sorted_d[i][1] = calc_distance( sorted_d[i][0], building_found.position ) + sorted_d[i][1]
+        found[n] = min( free, key = lambda p: self.score(p, position) )
+        taken.add( self.index(found[n]) )
 
-      sorted_d = sorted( distances.items(), key = lambda x: x[1] )
+      # more positions than points left, the rest share
+      for n in range(len(positions)):
+        if found[n] == None:
+          found[n] = self.nearest(positions[n])
 
-      return sorted_d[0][0]      
+      return found
 
     # adds a building
     def building(self, b):
       if not b in self.distances:
-        # ordered list of our points
-        distances = {}
-        for p in self.points:
-          distances[p] = calc_distance( p, b.position )
+        self.distances[b] = None
+        self.add_to_field(b)
 
-        distances = sorted( distances.items(), key = lambda x: x[1] )
+    # heap of the unexplored points ordered by distance from building b
+    def building_heap(self, b):
+      heap = [ (calc_distance( self.point(i), b.position ), i) for i in range(self.lattice.count) if self.unexplored(i) ]
+      heapq.heapify(heap)
+      return heap
 
-        #rebuild a list of points now that they are sorted
-        sorted_p = []
-        for i in distances:
-          sorted_p.append( i[0] ) # only take the point, which is in [0], the distance is in [1]
+    def add_to_field(self, b):
+      self.sites.append(b.position)
+
+    # returns the closest unexplored point to a known building
+    # explored points are popped off the building's heap as they surface
+    def nearest_to_building(self, b):
+      if not b in self.distances:
+        return None
 
-        self.distances[b] = sorted_p
-      
+      if self.distances[b] is None:
+        self.distances[b] = self.building_heap(b)
+
+      heap = self.distances[b]
+      while len(heap) > 0:
+        i = heap[0][1]
+        if self.unexplored(i):
+          return self.point(i)
+        heapq.heappop(heap)
+
+      return None
+
+    # is the point in cell i still unexplored?
+    def unexplored(self, i):
+      return not self.explored[i >> 3] & (1 << (i & 7))
+
+    # marks the point in cell i as explored
+    def explore(self, i):
+      bit = 1 << (i & 7)
+      if self.explored[i >> 3] & bit:
+        return
+
+      self.explored[i >> 3] |= bit
+      self.remaining -= 1
+      if self.leftover is not None:
+        self.leftover.discard( self.point(i) )
+
+    # marks every point within range of one of the units as explored
+    # only the cells around each unit are checked, not the whole map
     def update(self, units):
-      for p in self.points[:]:
-        for unit in units:
-          if unit.calcDistance( p ) < self.range:
-            self.points.remove(p)
-            for key,value in self.distances.iteritems():
-              if p in self.distances[key]:
-                self.distances[key].remove(p)
-            break
+      if self.remaining == 0:
+        return
+
+      for unit in units:
+        for i in self.lattice.near(unit.position):
+          if self.unexplored(i) and unit.calcDistance( self.point(i) ) < self.range:
+            self.explore(i)
+
+
+# stands in for a list of the unexplored points, working them out from a MapSearch's lattice
+# supports len(), iteration and membership tests
+class LatticePoints(object):
+    def __init__(self, search):
+      self.search = search
+
+    def __len__(self):
+      return self.search.remaining
+
+    def __iter__(self):
+      s = self.search
+      if s.leftover is not None:
+        for p in list(s.leftover):
+          yield p
+        return
+
+      for i in range(s.lattice.count):
+        if s.unexplored(i):
+          yield s.point(i)
+
+    def __contains__(self, p):
+      s = self.search
+      l = s.lattice
+      if s.remaining == 0 or (p[0] - l.start) % l.sight != 0 or (p[1] - l.start) % l.sight != 0:
+        return False
+
+      col, row = l.cell(p)
+      i = row * l.cols + col
+      return l.point(i) == tuple(p) and s.unexplored(i)
+
+
+# LatticePoints for ArrayMapSearch, iterates the grid with numpy
+class GridPoints(LatticePoints):
+    def __iter__(self):
+      if self.search.remaining == 0:
+        return iter([])
+
+      l = self.search.lattice
+      rows, cols = numpy.nonzero(self.search.grid)
+      xs = (l.start + cols * l.sight).tolist()
+      ys = (l.start + rows * l.sight).tolist()
+      return iter(zip(xs, ys))
+
+
+# MapSearch backed by a NumPy boolean grid instead of a bitmask
+# update() checks every unit in one vectorized pass and the number of unexplored points is kept as a count
+# the api is the same as MapSearch so the AIs can use either one
+class ArrayMapSearch(MapSearch):
+    def __init__(self):
+      global numpy
+      numpy = load_numpy()
+      if numpy == None:
+        raise ImportError("ArrayMapSearch requires numpy")
+
+      MapSearch.__init__(self)
+      self.grid = None      # self.grid[row, col] is True while the point in that cell is unexplored
+      self.field = None     # self.field[i] = distance from the point in cell i to the closest known building
+      self.points = GridPoints(self)
+
+    def reset(self):
+      self.grid = numpy.ones( (self.lattice.cols, self.lattice.cols), dtype = bool )
+
+    # searches a window around position that doubles in size until no point outside it can be closer
+    def k_nearest(self, position, k, skip = ()):
+      if self.remaining == 0 or k <= 0:
+        return []
+
+      l = self.lattice
+      col, row = l.cell(position)
+      offset = max( abs(l.start + col * l.sight - position[0]), abs(l.start + row * l.sight - position[1]) )
+      max_r = max(col, row, l.cols - 1 - col, l.cols - 1 - row)
+
+      r = 1
+      while True:
+        top, left = max(row - r, 0), max(col - r, 0)
+        rows, cols = numpy.nonzero( self.grid[top:row + r + 1, left:col + r + 1] )
+        rows += top
+        cols += left
+        if len(skip) > 0:
+          keep = ~numpy.isin( rows * l.cols + cols, list(skip) )
+          rows, cols = rows[keep], cols[keep]
+
+        if len(rows) >= k or r >= max_r:
+          d = numpy.abs(l.start + cols * l.sight - position[0]) + numpy.abs(l.start + rows * l.sight - position[1])
+          i = rows * l.cols + cols
+          best = numpy.lexsort( (i, d) )[:k]
+
+          # any point outside the window is at least (r + 1) * sight - offset away
+          if r >= max_r or d[best[-1]] < (r + 1) * l.sight - offset:
+            return [ l.point(j) for j in i[best].tolist() ]
+
+        r *= 2
+
+    def building_heap(self, b):
+      l = self.lattice
+      i = numpy.flatnonzero(self.grid)
+      d = numpy.abs(l.start + (i % l.cols) * l.sight - b.position[0]) + numpy.abs(l.start + (i // l.cols) * l.sight - b.position[1])
+      heap = list(zip( d.tolist(), i.tolist() ))
+      heapq.heapify(heap)
+      return heap
+
+    # the grid is stored whole anyway, so the building distances are too
+    def score(self, p, position):
+      d = calc_distance(p, position)
+      if self.field is not None:
+        d += self.field[self.index(p)]
+      return d
+
+    def add_to_field(self, b):
+      l = self.lattice
+      coords = l.start + numpy.arange(l.cols) * l.sight
+      d = ( numpy.abs(coords - b.position[1])[:, None] + numpy.abs(coords - b.position[0])[None, :] ).reshape(-1)
+
+      if self.field is None:
+        self.field = d
+      else:
+        numpy.minimum(self.field, d, out = self.field)
+
+    def unexplored(self, i):
+      return bool(self.grid.flat[i])
+
+    def explore(self, i):
+      if self.grid.flat[i]:
+        self.grid.flat[i] = False
+        self.remaining -= 1
+
+    # marks every point within range of one of the units as explored
+    # every unit's cells are tested at once using straight line distance, the same distance unit.calcDistance() uses
+    def update(self, units):
+      if self.remaining == 0:
+        return
+
+      positions = numpy.array( [unit.position for unit in units], dtype = float ).reshape(-1, 2)
+      if len(positions) == 0:
+        return
+
+      l = self.lattice
+      offsets = numpy.array(l.cover)
+      centers = numpy.rint( (positions - l.start) / l.sight ).astype(int).clip(0, l.cols - 1)
+
+      # candidate cells around every unit, shaped (units, offsets)
+      cols = centers[:, 0, None] + offsets[None, :, 0]
+      rows = centers[:, 1, None] + offsets[None, :, 1]
+
+      dx = l.start + cols * l.sight - positions[:, 0, None]
+      dy = l.start + rows * l.sight - positions[:, 1, None]
+
+      inside = (cols >= 0) & (cols < l.cols) & (rows >= 0) & (rows < l.cols)
+      hit = inside & (dx * dx + dy * dy < self.range * self.range)
+
+      i = numpy.unique( rows[hit] * l.cols + cols[hit] )
+      flat = self.grid.reshape(-1)
+      self.remaining -= int(numpy.count_nonzero(flat[i]))
+      flat[i] = False
+
+
+# MapSearch that keeps a count of explored points for every node of a quadtree over the lattice
+# level 0 nodes are single cells, each level up a node covers a 2x2 block of the level below, the top node covers everything
+# nearest() searches the tree closest node first and skips nodes with nothing left to explore
+# it is slower than MapSearch's ring search at every map size measured (see bench/bench_mapsearch.py), nothing uses it
+class QuadMapSearch(MapSearch):
+    def __init__(self):
+      MapSearch.__init__(self)
+      self.levels = 0       # level of the top node, at least 1
+      self.widths = []      # self.widths[level] = number of nodes across at that level
+      self.counts = []      # self.counts[level][node] = explored points under that node, missing means none
+                            # node = by * self.widths[level] + bx
+                            # level 0 is not counted, the explored bitmask already covers single cells
+
+    def reset(self):
+      MapSearch.reset(self)
+      cols = self.lattice.cols
+
+      self.levels = 1
+      while (1 << self.levels) < cols:
+        self.levels += 1
+
+      self.widths = [ (cols + (1 << level) - 1) >> level for level in range(self.levels + 1) ]
+      self.counts = [ {} for level in range(self.levels + 1) ]
+
+    # returns up to k unexplored points ordered by distance to position, ties go to the earlier point in row order
+    # skip is a set of cell indexes to pass over as if they were explored, nodes still count them as unexplored
+    def k_nearest(self, position, k, skip = ()):
+      if self.remaining == 0 or k <= 0:
+        return []
+
+      # with only a few points left a scan of the leftovers still beats walking the tree
+      if self.remaining ** 2 <= self.lattice.count:
+        return MapSearch.k_nearest(self, position, k, skip)
+
+      l = self.lattice
+      cols, start, sight = l.cols, l.start, l.sight
+      px, py = position[0], position[1]
+      explored = self.explored
+      found = []
+
+      # entries are (distance, 0, level, bx, by) for nodes and (distance, 1, index) for cells
+      # a node's distance is the lowest distance to any point under it
+      # at equal distance nodes are opened before cells are taken so ties still come out in row order
+      heap = [ (0, 0, self.levels, 0, 0) ]
+      while len(heap) > 0 and len(found) < k:
+        entry = heapq.heappop(heap)
+        if entry[1] == 1:
+          found.append( l.point(entry[2]) )
+          continue
+
+        child = entry[2] - 1
+        size = 1 << child
+        counts = self.counts[child]
+        width = self.widths[child]
+
+        for cy in (entry[4] * 2, entry[4] * 2 + 1):
+          top = cy << child
+          if top >= cols:
+            continue
+
+          bottom = min(top + size, cols) - 1
+          low_y, high_y = start + top * sight, start + bottom * sight
+          dy = max(low_y - py, 0, py - high_y)
+
+          for cx in (entry[3] * 2, entry[3] * 2 + 1):
+            left = cx << child
+            if left >= cols:
+              continue
+
+            if child == 0:
+              i = top * cols + left
+              if not explored[i >> 3] & (1 << (i & 7)) and not i in skip:
+                heapq.heappush( heap, (abs(start + left * sight - px) + abs(low_y - py), 1, i) )
+              continue
+
+            right = min(left + size, cols) - 1
+            if (right - left + 1) * (bottom - top + 1) > counts.get(cy * width + cx, 0):
+              dx = max(start + left * sight - px, 0, px - start - right * sight)
+              heapq.heappush( heap, (dx + dy, 0, child, cx, cy) )
+
+      return found
+
+    def explore(self, i):
+      if not self.unexplored(i):
+        return
+
+      MapSearch.explore(self, i)
+
+      col, row = i % self.lattice.cols, i // self.lattice.cols
+      for level in range(1, self.levels + 1):
+        node = (row >> level) * self.widths[level] + (col >> level)
+        self.counts[level][node] = self.counts[level].get(node, 0) + 1
@@ -35,13 +35,7 @@ class MarcoPolo(ai.AI):
 
     # returns a random position on the circumference of a given circle
     def position_on_circle(self, radius, center):
-      x,y = -1,-1
-
-      while not isValidSquare( (x,y), self.mapsize):
-        angle = random.randint(0,360)
-        x = center[0] + radius * math.sin(angle)
-        y = center[1] + radius * math.cos(angle)
-      return (x,y)        
+      return wedgeutil.radian_arcs.sample(radius, center, self.mapsize)
 
     # attempts to capture any visible building
     def capture(self, unit):
@@ -52,13 +46,7 @@ class MarcoPolo(ai.AI):
         if building.team == self.team:
           continue
 
-        friend_capturing = False
-        for friend in self.my_units:
-          if friend != unit:
-            if friend.is_capturing and friend.position == building.position:
-              friend_capturing = True
-
-        if friend_capturing:
+        if building.position in self.capturing:
           continue
   
         if unit.position == building.position:
@@ -68,13 +56,15 @@ class MarcoPolo(ai.AI):
         return True
 
   
-    # attempt to move to unexplored area of the map, if fully explored then wander
-    def explore(self, unit):
-      point = self.map.nearest(unit.position)
-      if point == None:
-        self.wander(unit)
-      else:
-        unit.move(point)
+    # attempt to move units to unexplored areas of the map, if fully explored then wander
+    # all units are handed their points in one batch so they don't head for the same point
+    def explore(self, units):
+      points = self.map.nearest_many( [unit.position for unit in units] )
+      for unit, point in zip(units, points):
+        if point == None:
+          self.wander(unit)
+        else:
+          unit.move(point)
 
     # draws highlights for debugging
     def highlight(self):
@@ -104,6 +94,9 @@ class MarcoPolo(ai.AI):
       # update our map
       self.map.update(self.my_units)      
 
+      # buildings our units are already capturing
+      self.capturing = capturing_units(self.my_units)
+
       # Add new buildings we discover
       for building in self.visible_buildings:
         if not building in self.bases:
@@ -117,11 +110,13 @@ class MarcoPolo(ai.AI):
           targets.append(building)
          
       # Loop through our drones
-      for unit in self.drones:
+      explorers = []  # drones that will explore this turn
+      nearest = closest_indexes( [unit.position for unit in self.drones], [t.position for t in targets] )
+      for unit, n in zip(self.drones, nearest):
         # Attempt to capture any building in range
         if not self.capture(unit):
           if len(targets) > 0:
-            t = closest_thing(unit.position, targets)
+            t = targets[n]
 
             if (len(self.map.points) == 0) or (calc_distance(unit.position, t.position) < unit.sight * 2):
               unit.move(t.position)
@@ -132,4 +127,6 @@ class MarcoPolo(ai.AI):
               unit.shoot(unit.visible_enemies[0].position)
               continue
 
-          self.explore(unit)
+          explorers.append(unit)
+
+      self.explore(explorers)
@@ -0,0 +1,49 @@
+require_dependency(module_name = "spatial")
+
+# what our units can see this turn, read from the game once and shared by every task
+# build a new one each turn, after units have moved
+class Perception(object):
+  def __init__(self, units):
+    self.in_range = {}  # self.in_range[unit] = unit.in_range_enemies as read this turn
+
+    self.enemies = spatial.SpatialIndex( self.in_range_of(units) ) # every enemy in range of one of units
+    self.friends = spatial.SpatialIndex(units)
+
+  # unit.in_range_enemies, only asked of the game once a turn
+  def enemies_of(self, unit):
+    if not unit in self.in_range:
+      self.in_range[unit] = unit.in_range_enemies
+
+    return self.in_range[unit]
+
+  # every enemy in range of one of units, each once, in the order the units see them
+  def in_range_of(self, units):
+    found = []
+    seen = set()
+    for unit in units:
+      for enemy in self.enemies_of(unit):
+        if not enemy in seen:
+          seen.add(enemy)
+          found.append(enemy)
+
+    return found
+
+  # our units within radius of position
+  def friends_near(self, position, radius):
+    return self.friends.within_radius(position, radius)
+
+  # the closest enemy to position, only counting those in among (a set) when it is given
+  def closest(self, position, among = None):
+    if among == None:
+      return self.enemies.closest(position)
+
+    k = 1
+    while True:
+      found = self.enemies.k_nearest(position, k)
+      for enemy in found:
+        if enemy in among:
+          return enemy
+
+      if len(found) < k:
+        return None
+      k *= 2
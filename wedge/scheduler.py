@@ -0,0 +1,86 @@
+import heapq
+
+# TaskScheduler keeps tasks in priority order, lowest priority value first, ties go to the task added first
+# tasks report priority changes themselves (see Task.priority), so only the tasks that changed get re-filed
+# instead of sorting every task every turn
+# it also keeps track of which tasks listen for which events (see Task.events) so the AI can tell them
+class TaskScheduler(object):
+  def __init__(self, tasks = []):
+    self.heap = []      # (priority, order, task), entries that are no longer in self.entries are skipped
+    self.entries = {}   # self.entries[task] = the current heap entry for task
+    self.dirty = []     # tasks whose priority changed since ordered() last ran
+    self.next = 0       # order given to the next task added
+    self.cache = None   # the result of ordered(), until something changes
+    self.listeners = {} # self.listeners[event] = set of tasks listening for event
+
+    for task in tasks:
+      self.add(task)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __contains__(self, task):
+    return task in self.entries
+
+  def __iter__(self):
+    return iter(self.ordered())
+
+  def add(self, task):
+    if task in self.entries:
+      return
+
+    task.scheduler = self
+    for event in task.events:
+      self.listeners.setdefault(event, set()).add(task)
+    self.file(task, self.next)
+    self.next += 1
+
+  def remove(self, task):
+    if not task in self.entries:
+      return
+
+    del self.entries[task]
+    for event in task.events:
+      self.listeners[event].discard(task)
+    task.scheduler = None
+    self.cache = None
+
+  # called by a task when its priority is set to something new
+  def changed(self, task):
+    self.dirty.append(task)
+
+  # the tasks listening for event
+  def listening(self, event):
+    return self.listeners.get(event, set())
+
+  # event happened, every task listening for it has to update
+  def notify(self, event):
+    for task in self.listening(event):
+      task.dirty = True
+
+  def file(self, task, order):
+    entry = (task.priority, order, task)
+    self.entries[task] = entry
+    heapq.heappush(self.heap, entry)
+    self.cache = None
+
+  # returns the tasks in priority order
+  def ordered(self):
+    # a priority set back to what it was filed under needs nothing
+    for task in self.dirty:
+      entry = self.entries.get(task)
+      if entry != None and entry[0] != task.priority:
+        self.file(task, entry[1])
+    self.dirty = []
+
+    if self.cache != None:
+      return self.cache
+
+    # drop stale entries once they are most of the heap
+    if len(self.heap) > 2 * len(self.entries):
+      self.heap = [ e for e in self.heap if self.entries.get(e[2]) is e ]
+
+    # a sorted list is still a heap, and sorting the heap sorted last time only has to place what was pushed since
+    self.heap.sort()
+    self.cache = [ e[2] for e in self.heap if self.entries.get(e[2]) is e ]
+    return self.cache
@@ -0,0 +1,158 @@
+import heapq
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from wedgeutil import calc_distance
+
+# SpatialIndex buckets things (units, buildings, anything with a .position) into a grid of square cells
+# build one per turn, positions are read once when the index is built
+# distances are the same manhattan distances calc_distance() uses, ties go to the thing that came first in the list
+class SpatialIndex(object):
+  def __init__(self, things, cell = None):
+    self.entries = {}   # self.entries[thing] = (order, position, key of its bucket)
+    self.buckets = {}   # self.buckets[(col, row)] = [(order, position, thing), ...]
+    self.low = [0, 0]   # lowest and highest bucket (col, row) ever used, bounds how far a search has to go
+    self.high = [0, 0]
+    self.next = 0       # order given to the next thing added
+
+    things = list(things)
+    positions = [ t.position for t in things ]
+
+    # aim for about one thing per cell
+    if cell == None:
+      cell = 16
+      if len(positions) > 1:
+        width = max( [p[0] for p in positions] ) - min( [p[0] for p in positions] )
+        height = max( [p[1] for p in positions] ) - min( [p[1] for p in positions] )
+        cell = max( int( (max(width, height, 1) ** 2 / float(len(positions))) ** 0.5 ), 1 )
+    self.cell = cell
+
+    for order, t in enumerate(things):
+      self.add(t, positions[order], order)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __iter__(self):
+    found = sorted( self.entries.items(), key = lambda e: e[1][0] )
+    return iter( [ t for t, e in found ] )
+
+  def __contains__(self, thing):
+    return thing in self.entries
+
+  def key(self, position):
+    return ( int(position[0] // self.cell), int(position[1] // self.cell) )
+
+  def add(self, thing, position = None, order = None):
+    if thing in self.entries:
+      return
+
+    if position == None:
+      position = thing.position
+    if order == None:
+      order = self.next
+    self.next = max(self.next, order + 1)
+
+    key = self.key(position)
+    if len(self.entries) == 0:
+      self.low, self.high = list(key), list(key)
+    else:
+      self.low = [ min(self.low[0], key[0]), min(self.low[1], key[1]) ]
+      self.high = [ max(self.high[0], key[0]), max(self.high[1], key[1]) ]
+
+    self.entries[thing] = (order, position, key)
+    self.buckets.setdefault(key, []).append( (order, position, thing) )
+
+  def remove(self, thing):
+    if not thing in self.entries:
+      return
+
+    order, position, key = self.entries.pop(thing)
+    bucket = self.buckets[key]
+    bucket.remove( (order, position, thing) )
+    if len(bucket) == 0:
+      del self.buckets[key]
+
+  # yields the buckets exactly r rings away from bucket (col, row)
+  def ring(self, col, row, r):
+    if r == 0:
+      keys = [ (col, row) ]
+    else:
+      keys = [ (x, row - r) for x in range(col - r, col + r + 1) ]
+      keys += [ (x, row + r) for x in range(col - r, col + r + 1) ]
+      keys += [ (col - r, y) for y in range(row - r + 1, row + r) ]
+      keys += [ (col + r, y) for y in range(row - r + 1, row + r) ]
+
+    for key in keys:
+      bucket = self.buckets.get(key)
+      if bucket != None:
+        yield bucket
+
+  # returns up to k things ordered by distance to position
+  def k_nearest(self, position, k):
+    if len(self.entries) == 0 or k <= 0:
+      return []
+
+    col, row = self.key(position)
+    max_r = max( col - self.low[0], row - self.low[1], self.high[0] - col, self.high[1] - row, 0 )
+
+    found = [] # max heap of the best k so far as (-distance, -order, thing)
+    for r in range(0, max_r + 1):
+      # anything r rings out is at least (r - 1) cells away
+      if len(found) == k and (r - 1) * self.cell > -found[0][0]:
+        break
+
+      # the rings have grown past the number of things left, checking them all is cheaper
+      if (2 * r + 1) ** 2 > 4 * len(self.entries):
+        return self.scan(position, k)
+
+      for bucket in self.ring(col, row, r):
+        for order, p, t in bucket:
+          entry = ( -calc_distance(p, position), -order, t )
+          if len(found) < k:
+            heapq.heappush(found, entry)
+          elif entry[:2] > found[0][:2]:
+            heapq.heapreplace(found, entry)
+
+    found.sort( key = lambda e: (e[0], e[1]), reverse = True )
+    return [ e[2] for e in found ]
+
+  # k_nearest() by checking every thing
+  def scan(self, position, k):
+    found = [ (calc_distance(p, position), order, t) for t, (order, p, key) in self.entries.items() ]
+    found = heapq.nsmallest( k, found, key = lambda e: (e[0], e[1]) )
+    return [ e[2] for e in found ]
+
+  # returns the closest thing to position, or None
+  def closest(self, position):
+    found = self.k_nearest(position, 1)
+    if len(found) == 0:
+      return None
+
+    return found[0]
+
+  # returns every thing within radius of position, in the order they were given
+  def within_radius(self, position, radius):
+    found = []
+    if len(self.entries) == 0:
+      return found
+
+    low = self.key( (position[0] - radius, position[1] - radius) )
+    high = self.key( (position[0] + radius, position[1] + radius) )
+    cols = range( max(low[0], self.low[0]), min(high[0], self.high[0]) + 1 )
+    rows = range( max(low[1], self.low[1]), min(high[1], self.high[1]) + 1 )
+
+    # a radius covering more buckets than there are things is cheaper to check thing by thing
+    if len(cols) * len(rows) > 4 * len(self.entries):
+      buckets = self.buckets.values()
+    else:
+      buckets = [ self.buckets.get( (col, row), [] ) for col in cols for row in rows ]
+
+    for bucket in buckets:
+      for order, p, t in bucket:
+        if calc_distance(p, position) <= radius:
+          found.append( (order, t) )
+
+    found.sort( key = lambda e: e[0] )
+    return [ e[1] for e in found ]
@@ -3,16 +3,25 @@ import random
 
 require_dependency(module_name = "wedgeutil")
 require_dependency(module_name = "mapsearch")
+require_dependency(module_name = "bullseye")
 
 from wedgeutil import *
 
+# how far from its path a shot can hit a unit, shots that pass no closer than this to our units are not checked with the game
+friendly_fire_radius = 2
+
 # A task can be something like "defend x" or "attack x"
 # Tasks are all given to a position on the map
 # For instance, when we take over a new base we'd create a task DefendTask
 # the task will automatically request & release units as needed
 class Task(object):
+  # events the task's update() depends on, the AI marks it dirty through the scheduler when one happens
+  # a task listening for nothing updates every turn
+  events = ()
+
   def __init__(self, ai, position):
     self.ai = ai                # holds our AI so we can query it
+    self.scheduler = None       # the scheduler.TaskScheduler holding this task, told when the priority changes
     self.name = "Task"          # AI can query to find type of task it is
     self.position = position    # all tasks have a position associated with them where the task is to be accomplished
     self.priority = 0           # the task priority, higher priority tasks have their unit needs filled first
@@ -21,6 +30,19 @@ class Task(object):
                                 # units_minimum are filled before units_needed
     self.units_assigned = []    # track the assigned units
     self.is_default = False        # if true, this is the "default task" which is assigned all extra units
+    self.dirty = True           # something update() depends on changed since it last ran, see refresh()
+    self.wake_turn = None       # a turn update() has to run on even if nothing happens, see wake()
+
+  @property
+  def priority(self):
+    return self._priority
+
+  @priority.setter
+  def priority(self, value):
+    changed = value != getattr(self, '_priority', None)
+    self._priority = value
+    if changed and self.scheduler != None:
+      self.scheduler.changed(self)
 
   def is_full(self):
     return len(self.units_assigned) >= self.units_needed
@@ -32,6 +54,23 @@ class Task(object):
   # update task logic, do not carry out any actions
   def update(self):
     pass
+
+  # runs update() if the task is dirty or was asked to wake this turn, the AI calls this instead of update()
+  def refresh(self):
+    waking = self.wake_turn != None and self.ai.current_turn >= self.wake_turn
+    if len(self.events) == 0 or self.dirty or waking:
+      self.dirty = False
+      self.wake_turn = None
+      self.update()
+
+  # makes sure update() runs on turn, for changes that come with time rather than events
+  def wake(self, turn):
+    if self.wake_turn == None or turn < self.wake_turn:
+      self.wake_turn = turn
+
+  # are there enemies update() needs to look at? checked each turn for tasks listening for "enemies"
+  def sees_enemies(self):
+    return False
   
   # carry out actions here
   def do_actions(self):
@@ -40,25 +79,73 @@ class Task(object):
   def add_unit(self, unit):
     if not unit in self.units_assigned:
       self.units_assigned.append(unit)
+      self.dirty = True
 
   def dead_unit(self, unit):
     if unit in self.units_assigned:
       self.units_assigned.remove(unit)
+      self.dirty = True
 
   # attack any in range units
   def attack(self, unit):
-    enemies = unit.in_range_enemies
-    if len(enemies) > 0:
-      enemy = self.select_target(unit, enemies)
-      shoot_at = self.ai.enemy_predictor[enemy].predict(unit.position, settings.bullet.speed)
-      victims = unit.calcVictims(shoot_at)			
+    return unit in self.attack_many( [unit] )
+
+  # attack() for a list of units, their shots are predicted together
+  # returns the set of units that fired
+  # victims_many(shooters, aims) gives the units each shot would hit, see calc_victims_many()
+  def attack_many(self, units, victims_many = calc_victims_many):
+    shooters = []
+    targets = []
+    for unit in units:
+      enemies = self.ai.perception.enemies_of(unit)
+      if len(enemies) > 0:
+        enemy = self.select_target(unit, enemies)
+        shooters.append(unit)
+        targets.append(self.ai.enemy_predictor[enemy])
+
+    aims = bullseye.Predictor.predict_many( [unit.position for unit in shooters], targets, settings.bullet.speed )
+
+    # only shots that pass close to one of our units need their victims from the game
+    risky = self.risky_shots(shooters, aims)
+    victims = dict( zip( risky, victims_many( [shooters[i] for i in risky], [aims[i] for i in risky] ) ) )
+
+    fired = set()
+    friends = self.ai.my_unit_ids
+    for i, (unit, shoot_at) in enumerate(zip(shooters, aims)):
+      friendly = False
+
+      for v in victims.get(i, []):
+        if v.unit_id in friends:
+          friendly = True
+          break
+
+      if not friendly:
+        unit.shoot( shoot_at )
+        fired.add(unit)
+
+    return fired
+
+  # indexes of the shots whose path passes within friendly_fire_radius of one of our units other than the shooter
+  # each path is tested against all the units near it in one call
+  def risky_shots(self, shooters, aims):
+    risky = []
+    for i, (unit, aim) in enumerate(zip(shooters, aims)):
+      dx, dy = aim[0] - unit.position[0], aim[1] - unit.position[1]
+      reach = abs(dx) + abs(dy) + friendly_fire_radius
+      near = [ f.position for f in self.ai.perception.friends_near(unit.position, reach) if f != unit ]
+      if len(near) == 0:
+        continue
 
-      for v in victims:
-        if v in self.ai.my_units:
-          return False
+      if dx == 0 and dy == 0:
+        risky.append(i)
+        continue
 
-      unit.shoot( shoot_at )
-      return True
+      euclid = bullseye.load_euclid()
+      path = euclid.LineSegment2( euclid.Point2(unit.position[0], unit.position[1]), euclid.Vector2(dx, dy) )
+      if any( path.intersect_circles(near, friendly_fire_radius) ):
+        risky.append(i)
+
+    return risky
 
   def select_target(self, unit, units):
     for enemy in units:
@@ -74,10 +161,8 @@ class Task(object):
     if unit.is_capturing:
       return True
 
-    for friend in self.units_assigned:
-      if friend != unit:
-        if friend.is_capturing and friend.position == building.position:
-          return False
+    if building.position in self.ai.capturing:
+      return False
 
     if unit.position == building.position:
       unit.capture(building)
@@ -97,10 +182,8 @@ class BuildingTask(Task):
     if unit.is_capturing:
         return True
 
-    for friend in self.ai.my_units:
-      if friend != unit:
-        if friend.is_capturing and friend.position == self.building.position:
-          return False
+    if self.building.position in self.ai.capturing:
+      return False
 
     if unit.position == self.building.position:
       unit.capture(self.building)
@@ -110,6 +193,8 @@ class BuildingTask(Task):
     return True  
 
 class DefendTask(BuildingTask):
+  events = ("enemies",)
+
   def __init__(self, ai, building):
     BuildingTask.__init__(self, ai, building)
     self.name = "Defend"
@@ -117,8 +202,9 @@ class DefendTask(BuildingTask):
 
     # defend specific variables
     self.deaths = 0
-    self.last_death = 0
-    self.enemies = []
+    self.last_death = 0       # turn deaths last went up or wore off by one
+    self.enemies = []         # enemies in range of our units, from the AI's perception each update()
+    self.enemy_set = set()
 
     self.calcUnitsNeeded()
 
@@ -129,26 +215,30 @@ class DefendTask(BuildingTask):
     if unit in self.units_assigned:
       self.units_assigned.remove(unit)
       self.deaths += 1
-      self.last_death = 0
+      self.last_death = self.ai.current_turn
       self.calcUnitsNeeded()
+      self.dirty = True
 
-  def update(self):
-    if len(self.units_assigned) == 0:
-      return
-
-    self.enemies = []
+  # the same units update() takes its enemies from, those within sight of the building
+  def sees_enemies(self):
+    if len(self.enemies) > 0:
+      return True
 
-    # make list of nearby enemies
     for unit in self.units_assigned:
-      d = calc_distance(unit.position, self.position)
+      if calc_distance(unit.position, self.position) <= unit.sight:
+        if len(self.ai.perception.enemies_of(unit)) > 0:
+          return True
 
-      if d > unit.sight:
-        continue
+    return False
 
-      for enemy in unit.in_range_enemies:
-        if not enemy in self.enemies:
-          self.enemies.append(enemy)
+  def update(self):
+    if len(self.units_assigned) == 0:
+      return
 
+    # make list of nearby enemies
+    near = [ unit for unit in self.units_assigned if calc_distance(unit.position, self.position) <= unit.sight ]
+    self.enemies = self.ai.perception.in_range_of(near)
+    self.enemy_set = set(self.enemies)
   
     self.priority = 8
     if len(self.enemies) >= len(self.units_assigned):
@@ -156,21 +246,31 @@ class DefendTask(BuildingTask):
     elif len(self.units_assigned) == 0:
       self.priority = 2
 
+    # a death wears off every 100 turns
+    while self.deaths > 0 and self.ai.current_turn - self.last_death >= 100:
+      self.deaths -= 1
+      self.last_death += 100
     if self.deaths > 0:
-      self.last_death += 1
-      if self.last_death % 100 == 0:
-        self.deaths -= 1
+      self.wake(self.last_death + 100)
 
     self.calcUnitsNeeded()
 
+    # calcUnitsNeeded() also goes up with the turn early on
+    for turn in (settings.building.spawn_time * 3, settings.building.spawn_time * 6):
+      if self.ai.current_turn < turn:
+        self.wake(turn)
+        break
+
     while len(self.units_assigned) > self.units_needed:
       u = self.units_assigned[-1]
       self.ai.drones.append(u)
       self.units_assigned.remove(u)
+      self.dirty = True
 
   def do_action(self):
+    fired = self.attack_many(self.units_assigned)
     for unit in self.units_assigned:
-      if not self.attack(unit):
+      if not unit in fired:
         if len(unit.visible_buildings) > 0:
             enemy_buildings = filter(self.is_enemy, unit.visible_buildings)
             b = closest_thing(unit.position, enemy_buildings)
@@ -179,17 +279,14 @@ class DefendTask(BuildingTask):
                 continue
 
         if len(self.enemies) > 0:
-          closest = closest_thing(unit.position, self.enemies)
+          closest = self.ai.perception.closest(unit.position, self.enemy_set)
           unit.move(closest.position)
           continue
 
         d = calc_distance(unit.position, self.position)
 
         if not unit.is_moving or d > unit.sight * 0.5:
-          p = (-1,-1)
-
-          while not isValidSquare(p, self.ai.mapsize):
-            p = position_on_circle(unit.sight * 0.5, self.position)
+          p = valid_position_on_circle(unit.sight * 0.5, self.position, self.ai.mapsize)
           
           unit.move(p)
 
@@ -224,6 +321,8 @@ class DefendTask(BuildingTask):
       self.units_needed = min(self.units_needed, 6) # 8 is the max units set to defend
 
 class CaptureTask(BuildingTask):
+  events = ("enemies", "buildings")
+
   def __init__(self, ai, building):
     BuildingTask.__init__(self, ai, building)
     self.name = "Capture"
@@ -233,7 +332,8 @@ class CaptureTask(BuildingTask):
     self.attack_launched = False
     self.rally = (0,0)
     self.last_death = 0
-    self.enemies = []
+    self.enemies = []         # enemies in range of our units, from the AI's perception each update()
+    self.enemy_set = set()
     
   def is_finished(self):
     return self.building.team == self.ai.team
@@ -245,6 +345,18 @@ class CaptureTask(BuildingTask):
         self.units_needed += 1
         self.units_needed = min(self.units_needed, 8)
       self.last_death = self.ai.current_turn
+      self.dirty = True
+
+  # the units go wherever the rally point or the attack takes them, so ask each of them
+  def sees_enemies(self):
+    if len(self.enemies) > 0:
+      return True
+
+    for unit in self.units_assigned:
+      if len(self.ai.perception.enemies_of(unit)) > 0:
+        return True
+
+    return False
 
   def update(self):
     if len(self.units_assigned) == 0:
@@ -263,11 +375,8 @@ class CaptureTask(BuildingTask):
     if len(self.units_assigned) >= self.units_needed:
       self.attack_launched = True
 
-    self.enemies = []
-    for unit in self.units_assigned:
-      for enemy in unit.in_range_enemies:
-        if enemy not in self.enemies:
-          self.enemies.append(enemy)
+    self.enemies = self.ai.perception.in_range_of(self.units_assigned)
+    self.enemy_set = set(self.enemies)
 
     if self.attack_launched:
       # if we've lost over 2/3 of ours units retreat
@@ -276,9 +385,10 @@ class CaptureTask(BuildingTask):
           self.attack_launched = False
 
   def do_action(self):
+    fired = self.attack_many(self.units_assigned)
     for unit in self.units_assigned:
       # always attack enemy units
-      if not self.attack(unit):
+      if not unit in fired:
         # has the attack launched?
         if self.attack_launched:
           if len(unit.visible_buildings) > 0:
@@ -288,22 +398,16 @@ class CaptureTask(BuildingTask):
               if self.capture_target(unit, b):
                 continue
           if not unit.is_moving:
-            p = (-1,-1)
-
-            while not isValidSquare(p, self.ai.mapsize):
-              p = position_on_circle(unit.sight, self.position)
+            p = valid_position_on_circle(unit.sight, self.position, self.ai.mapsize)
             
             unit.move(p) 
         else:
           if len(self.enemies) > 0:
-            closest = closest_thing(unit.position, self.enemies)
+            closest = self.ai.perception.closest(unit.position, self.enemy_set)
             unit.move(closest.position)
             continue
           if not unit.is_moving:
-            p = (-1,-1)
-
-            while not isValidSquare(p, self.ai.mapsize):
-              p = position_on_circle(unit.sight, self.rally)
+            p = valid_position_on_circle(unit.sight, self.rally, self.ai.mapsize)
             
             unit.move(p)
 
@@ -337,11 +441,17 @@ class ExploreTask(Task):
       self.priority = 200
 
   def do_action(self):
+    explorers = []
+    fired = self.attack_many(self.units_assigned)
     for unit in self.units_assigned:
-      if not self.attack(unit):
-        point = self.ai.map.nearest(unit.position)
-        if point != None:
-          unit.move( point )
+      if not unit in fired:
+        explorers.append(unit)
+
+    # hand out points in one batch so explorers spread out
+    points = self.ai.map.nearest_many( [unit.position for unit in explorers] )
+    for unit, point in zip(explorers, points):
+      if point != None:
+        unit.move( point )
 
 class WanderAndKillTask(Task):
   def __init__(self, ai, position):
@@ -355,13 +465,11 @@ class WanderAndKillTask(Task):
     pass
 
   def do_action(self):
+    fired = self.attack_many(self.units_assigned)
     for unit in self.units_assigned:
-      if not self.attack(unit):
+      if not unit in fired:
         if not unit.is_moving:
-          p = (-1,-1)
-
-          while not isValidSquare(p, self.ai.mapsize):
-            p = position_on_circle(unit.sight * 2, unit.position)
+          p = valid_position_on_circle(unit.sight * 2, unit.position, self.ai.mapsize)
           
           unit.move(p)
 
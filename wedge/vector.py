@@ -0,0 +1,53 @@
+# the Vector2 operations bullseye needs, without loading all of euclid
+# works like euclid.Vector2 for these, and either can be used where the other is expected
+# like euclid's fast path, operands of the same class skip the indexing
+class Vector2(object):
+  __slots__ = ['x', 'y']
+  __hash__ = None
+
+  def __init__(self, x = 0, y = 0):
+    self.x = x
+    self.y = y
+
+  def __repr__(self):
+    return 'Vector2(%.2f, %.2f)' % (self.x, self.y)
+
+  def __len__(self):
+    return 2
+
+  def __getitem__(self, key):
+    return (self.x, self.y)[key]
+
+  def __iter__(self):
+    return iter( (self.x, self.y) )
+
+  def __eq__(self, other):
+    if other.__class__ is Vector2:
+      return self.x == other.x and self.y == other.y
+    return self.x == other[0] and self.y == other[1]
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __add__(self, other):
+    if other.__class__ is Vector2:
+      return Vector2(self.x + other.x, self.y + other.y)
+    return Vector2(self.x + other[0], self.y + other[1])
+
+  def __sub__(self, other):
+    if other.__class__ is Vector2:
+      return Vector2(self.x - other.x, self.y - other.y)
+    return Vector2(self.x - other[0], self.y - other[1])
+
+  def __mul__(self, other):
+    return Vector2(self.x * other, self.y * other)
+
+  __rmul__ = __mul__
+
+  def dot(self, other):
+    if other.__class__ is Vector2:
+      return self.x * other.x + self.y * other.y
+    return self.x * other[0] + self.y * other[1]
+
+  def magnitude_squared(self):
+    return self.x * self.x + self.y * self.y
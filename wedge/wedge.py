@@ -12,6 +12,7 @@ require_dependency(module_name = "wedgeutil")
 require_dependency(module_name = "buildinginfo")
 require_dependency(module_name = "mapsearch")
 require_dependency(module_name = "bullseye" )
+require_dependency(module_name = "spatial")
 
 from wedgeutil import closest_thing
 
@@ -42,7 +43,7 @@ class Wedge(ai.AI):
 
       # enemies
       self.enemies_attacked = {}
-      self.enemy_predictor = defaultdict(bullseye.Predictor)
+      self.enemy_predictor = bullseye.Predictors(self.mapsize)
 
     # Behavior methods
     # wanders the map, changing direction every self.wander_radius
@@ -52,23 +53,15 @@ class Wedge(ai.AI):
 
     # returns a random position on the circumference of a given circle
     def position_on_circle(self, radius, center):
-      x,y = -1,-1
-
-      while not isValidSquare( (x,y), self.mapsize):
-        angle = random.randint(0,360)
-        x = center[0] + radius * math.sin(angle)
-        y = center[1] + radius * math.cos(angle)
-      return (x,y)        
+      return wedgeutil.radian_arcs.sample(radius, center, self.mapsize)
 
     # can/should the specified unit capture the specified building?
     def capture_target(self, unit, building):
       if unit.is_capturing:
         return True
 
-      for friend in self.my_units:
-        if friend != unit:
-          if friend.is_capturing and friend.position == building.position:
-            return False
+      if building.position in self.capturing:
+        return False
 
       if unit.position == building.position:
         unit.capture(building)
@@ -86,13 +79,7 @@ class Wedge(ai.AI):
         if building.team == self.team:
           continue
 
-        friend_capturing = False
-        for friend in self.my_units:
-          if friend != unit:
-            if friend.is_capturing and friend.position == building.position:
-              friend_capturing = True
-
-        if friend_capturing:
+        if building.position in self.capturing:
           continue
   
         if unit.position == building.position:
@@ -103,12 +90,25 @@ class Wedge(ai.AI):
 
     # attack any in range units
     def attack(self, unit):
-      enemies = unit.in_range_enemies
-      if len(enemies) > 0:
-				enemy = self.select_target(unit, enemies)
-				
-				unit.shoot( self.enemy_predictor[enemy].predict(unit.position, settings.bullet.speed) )
-				return True
+      return unit in self.attack_many( [unit] )
+
+    # attack() for a list of units, their shots are predicted together
+    # returns the set of units that fired
+    def attack_many(self, units):
+      shooters = []
+      targets = []
+      for unit in units:
+        enemies = unit.in_range_enemies
+        if len(enemies) > 0:
+          enemy = self.select_target(unit, enemies)
+          shooters.append(unit)
+          targets.append(self.enemy_predictor[enemy])
+
+      aims = bullseye.Predictor.predict_many( [unit.position for unit in shooters], targets, settings.bullet.speed )
+      for unit, shoot_at in zip(shooters, aims):
+        unit.shoot( shoot_at )
+
+      return set(shooters)
 
     def select_target(self, unit, units):
       for enemy in units:
@@ -119,13 +119,15 @@ class Wedge(ai.AI):
         
       return units[0]
   
-    # attempt to move to unexplored area of the map, if fully explored then wander
-    def explore(self, unit):
-      point = self.map.nearest(unit.position)
-      if point == None:
-        self.wander(unit)
-      else:
-        unit.move(point)
+    # attempt to move units to unexplored areas of the map, if fully explored then wander
+    # all units are handed their points in one batch so they don't head for the same point
+    def explore(self, units):
+      points = self.map.nearest_many( [unit.position for unit in units] )
+      for unit, point in zip(units, points):
+        if point == None:
+          self.wander(unit)
+        else:
+          unit.move(point)
 
     # defends a particular building
     def defend(self, unit, buildinginfo):
@@ -176,11 +178,11 @@ class Wedge(ai.AI):
       for enemy in enemies:
         self.enemies_attacked[enemy] = 0
 
-        # update our position tracking
-        if not enemy in self.enemy_predictor:
-					self.enemy_predictor[enemy] = bullseye.Predictor(enemy, self.mapsize)
-        else:
-          self.enemy_predictor[enemy].set_position(enemy.position)
+      # update our position tracking
+      self.enemy_predictor.update(enemies)
+
+      # buildings our units are already capturing
+      self.capturing = wedgeutil.capturing_units(self.my_units)
                      
       # update our map
       self.map.update(self.my_units)      
@@ -198,6 +200,7 @@ class Wedge(ai.AI):
          
       # Loop through all known buildings: 
       # value = BuildingInfo instance for the key = building
+      available = spatial.SpatialIndex(self.drones) # drones that could still be made defenders
       for key, value in self.buildings.iteritems():
         if len(value.perimeter) == 0:
           value.establish_perimeter(self.perimeter_distance)
@@ -211,12 +214,13 @@ class Wedge(ai.AI):
         
           # if the building has no defender, request one (preferably closest available unit)
           if value.defender == None:
-            drone_assigned = closest_thing( value.building.position, self.drones )
+            drone_assigned = closest_thing( value.building.position, available )
                        
             # assign drone to defend & remove from drone pool
             if drone_assigned != None:
               value.defender = drone_assigned
               self.drones.remove(drone_assigned)
+              available.remove(drone_assigned)
           # if we have a defender on this building, make sure its alive
           else:
             if value.defender.is_alive:
@@ -237,22 +241,26 @@ class Wedge(ai.AI):
                value.defender = None
     
       # Loop through our drones
+      goals = spatial.SpatialIndex(targets + enemies)
+      explorers = []  # drones that will explore this turn
+      fired = self.attack_many(self.drones) # attack any enemies in range
       for unit in self.drones:
-        # Attempt to attack any enemies in range
-        if not self.attack(unit):
+        if not unit in fired:
           # Attempt to capture any building in range
           if not self.capture(unit):
             # Either: Explore map or assist other drones
             if self.current_turn <= self.search_until:
-              self.explore(unit)
+              explorers.append(unit)
             else:
               # this area needs a lot of work, target selection is the weakest link right now
-              goto = closest_thing( unit.position, list(targets + enemies) )
+              goto = closest_thing( unit.position, goals )
               
               if goto == None:
-                self.explore(unit)
+                explorers.append(unit)
               else:
                 if goto in targets:
                   self.capture_target(unit, goto)
                 else:
                   unit.move( self.position_on_circle( unit.sight - 1, goto.position ) )
+
+      self.explore(explorers)
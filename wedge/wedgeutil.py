@@ -1,13 +1,35 @@
 import random
 import math
+import bisect
 from world import isValidSquare
 
+# numpy is optional, the distance matrix helpers fall back to plain python without it
+# it is slow to import, so it is only loaded the first time something asks for it, see load_numpy()
+numpy = None
+numpy_checked = False
+
+# returns numpy, or None when it isn't installed
+def load_numpy():
+  global numpy, numpy_checked
+  if not numpy_checked:
+    numpy_checked = True
+    try:
+      import numpy
+    except ImportError:
+      numpy = None
+
+  return numpy
+
 toRadians = 3.14159 / 180
 
 def calc_distance(a, b):
   return ( abs(a[0] - b[0]) + abs(a[1] - b[1]) )
 
+# things can also be a spatial.SpatialIndex, which answers without checking every thing
 def closest_thing(position, things):
+  if hasattr(things, 'closest'):
+    return things.closest(position)
+
   closest = 100000
   found = None
   
@@ -20,6 +42,48 @@ def closest_thing(position, things):
 
   return found
 
+# capturing[position] = one of units capturing the building at position
+# build it once a turn, a unit told to capture only starts on the next turn anyway
+def capturing_units(units):
+  capturing = {}
+  for unit in units:
+    if unit.is_capturing:
+      capturing[unit.position] = unit
+
+  return capturing
+
+# victims[i] = the units shooters[i] would hit firing at aims[i]
+# anything that answers for every shooter at once can stand in for this in Task.attack_many()
+def calc_victims_many(shooters, aims):
+  return [ unit.calcVictims(aim) for unit, aim in zip(shooters, aims) ]
+
+# positions as an (n, 2) array of floats
+def position_array(positions):
+  return load_numpy().array( [ (p[0], p[1]) for p in positions ], dtype = float ).reshape(-1, 2)
+
+# matrix[i][j] = calc_distance(a[i], b[j]) for two lists of positions
+# returns a numpy array when numpy is available, otherwise a list of lists, either can be indexed matrix[i][j]
+def distance_matrix(a, b):
+  if load_numpy() != None:
+    a, b = position_array(a), position_array(b)
+    return numpy.abs( a[:, None, 0] - b[None, :, 0] ) + numpy.abs( a[:, None, 1] - b[None, :, 1] )
+
+  return [ [ abs(p[0] - q[0]) + abs(p[1] - q[1]) for q in b ] for p in a ]
+
+# for each position in a, the index of the closest position in b by calc_distance, ties go to the earlier one
+# None for every position when b is empty
+def closest_indexes(a, b):
+  if len(b) == 0:
+    return [None] * len(a)
+  if len(a) == 0:
+    return []
+
+  matrix = distance_matrix(a, b)
+  if load_numpy() != None:
+    return numpy.argmin(matrix, axis = 1).tolist()
+
+  return [ min( range(len(row)), key = row.__getitem__ ) for row in matrix ]
+
 def position_on_circle(radius, center, angle = None):
   x,y = -1,-1
 
@@ -31,3 +95,107 @@ def position_on_circle(radius, center, angle = None):
   x = center[0] + radius * math.sin(angle)
   y = center[1] + radius * math.cos(angle)
   return (x,y)  
+
+# picks random points on the part of a circle that lies on the map, rather than retrying angles until one lands on it
+# angles is every angle the retry loop could pick from, each valid one stays just as likely as it was with retrying
+class ArcSampler(object):
+  def __init__(self, angles):
+    tau = 2 * math.pi
+    table = sorted( [ (a % tau, math.sin(a), math.cos(a)) for a in angles ] )
+    self.angles = [ t[0] for t in table ] # sorted around the circle, for finding the angles in an arc
+    self.sin = [ t[1] for t in table ]
+    self.cos = [ t[2] for t in table ]
+
+  def position(self, i, radius, center):
+    return ( center[0] + radius * self.sin[i], center[1] + radius * self.cos[i] )
+
+  # the arcs of [0, 2pi] where sin (or cos) of the angle is at least bound, as a list of (low, high)
+  def at_least(self, bound, sin):
+    tau = 2 * math.pi
+    if bound <= -1:
+      return [ (0, tau) ]
+    if bound > 1:
+      return []
+
+    if sin:
+      low, high = math.asin(bound), math.pi - math.asin(bound)
+    else:
+      low, high = -math.acos(bound), math.acos(bound)
+
+    if low < 0:
+      return [ (0, high), (low + tau, tau) ]
+    return [ (low, high) ]
+
+  # the rest of [0, 2pi] not covered by arcs
+  def outside(self, arcs):
+    found = []
+    start = 0
+    for low, high in sorted(arcs):
+      if low > start:
+        found.append( (start, low) )
+      start = max(start, high)
+
+    if start < 2 * math.pi:
+      found.append( (start, 2 * math.pi) )
+    return found
+
+  def overlap(self, a, b):
+    found = []
+    for low, high in a:
+      for l, h in b:
+        if max(low, l) <= min(high, h):
+          found.append( (max(low, l), min(high, h)) )
+    return found
+
+  # ranges [low, high) of the tables whose points are valid squares of the map
+  def ranges(self, radius, center, size):
+    arcs = [ (0, 2 * math.pi) ]
+    if radius > 0:
+      for c, sin in ( (center[0], True), (center[1], False) ):
+        arcs = self.overlap(arcs, self.at_least(-c / float(radius), sin))
+        arcs = self.overlap(arcs, self.outside(self.at_least((size - c) / float(radius), sin)))
+
+    # the arcs can be off by rounding, widen them a little and then trim their ends with the exact check
+    slack = 1e-9
+    found = []
+    for low, high in sorted(arcs):
+      low = bisect.bisect_left(self.angles, low - slack)
+      high = bisect.bisect_right(self.angles, high + slack)
+      if len(found) > 0 and low <= found[-1][1]:
+        found[-1] = ( found[-1][0], max(high, found[-1][1]) )
+      elif low < high:
+        found.append( (low, high) )
+
+    trimmed = []
+    for low, high in found:
+      while low < high and not isValidSquare(self.position(low, radius, center), size):
+        low += 1
+      while low < high and not isValidSquare(self.position(high - 1, radius, center), size):
+        high -= 1
+      if low < high:
+        trimmed.append( (low, high) )
+    return trimmed
+
+  # a random valid point on the circle
+  # when none of the circle is on the map, the square of the map closest to center
+  def sample(self, radius, center, size):
+    found = self.ranges(radius, center, size)
+    n = sum( [ high - low for low, high in found ] )
+    if n == 0:
+      return ( min(max(center[0], 0), size - 1), min(max(center[1], 0), size - 1) )
+
+    n = random.randrange(n)
+    for low, high in found:
+      if n < high - low:
+        return self.position(low + n, radius, center)
+      n -= high - low
+
+# the angles position_on_circle() picks from, in degrees
+degree_arcs = ArcSampler( [ a * toRadians for a in range(0, 361) ] )
+
+# the angles picked by the AIs that pass random.randint(0, 360) straight to math.sin, which takes them as radians
+radian_arcs = ArcSampler( range(0, 361) )
+
+# a position_on_circle() that is a valid square of the map
+def valid_position_on_circle(radius, center, size):
+  return degree_arcs.sample(radius, center, size)
@@ -9,6 +9,9 @@ require_dependency(module_name = "wedgeutil")
 require_dependency(module_name = "bullseye")
 require_dependency(module_name = "mapsearch")
 require_dependency(module_name = "tasks")
+require_dependency(module_name = "scheduler")
+require_dependency(module_name = "assignment")
+require_dependency(module_name = "perception")
 
 from wedgeutil import *
 
@@ -17,15 +20,18 @@ class WorkSmarter(ai.AI):
 
   def _init(self):
     self.drones = []
-    self.task_list = []
+    self.task_list = scheduler.TaskScheduler() # iterates in priority order
     self.buildings = defaultdict(bool)
   
     # add a default task, all drones not assigned another task will do this
-    self.task_list.append( tasks.ExploreTask(self, (0,0) ) )
+    self.task_list.add( tasks.ExploreTask(self, (0,0) ) )
 
     # enemies
     self.enemies_attacked = {}
-    self.enemy_predictor = defaultdict(bullseye.Predictor)
+    self.enemy_predictor = bullseye.Predictors(self.mapsize)
+
+    # buildings we owned last turn, to notice when they change hands
+    self.owned = frozenset()
 
     # map
     self.map = mapsearch.MapSearch()
@@ -63,37 +69,43 @@ class WorkSmarter(ai.AI):
     for enemy in self.visible_enemies:
       self.enemies_attacked[enemy] = 0
 
-      # update our position tracking
-      if not enemy in self.enemy_predictor:
-				self.enemy_predictor[enemy] = bullseye.Predictor(enemy, self.mapsize)
-      else:
-        self.enemy_predictor[enemy].set_position(enemy.position)
+    # update our position tracking
+    self.enemy_predictor.update(self.visible_enemies)
+
+    # ids of our units, for checking victims against without scanning my_units
+    self.my_unit_ids = frozenset( [unit.unit_id for unit in self.my_units] )
+
+    # buildings our units are already capturing
+    self.capturing = wedgeutil.capturing_units(self.my_units)
+
+    # what our units can see, shared by the tasks this turn
+    self.perception = perception.Perception(self.my_units)
 
     # look for new buildings
     for b in self.visible_buildings:
       if not b in self.buildings:
         if b.team == self.team:
-          self.task_list.append( tasks.DefendTask(self, b) )
+          self.task_list.add( tasks.DefendTask(self, b) )
         else:
-          self.task_list.append( tasks.CaptureTask(self, b) )
+          self.task_list.add( tasks.CaptureTask(self, b) )
       
       self.buildings[b] = (b.team == self.team)
 
     # remove completed tasks
-    for task in self.task_list[:]:
+    for task in self.task_list.ordered():
       if task.is_finished():
         if task.name == "Capture":
           t = tasks.DefendTask(self, task.building)
           t.units_assigned = task.units_assigned
           task.units_assigned = []
-          self.task_list.append( t )
+          self.task_list.add( t )
         elif task.name == "Defend":
           t = tasks.CaptureTask(self, task.building)
           t.units_assigned = task.units_assigned
           task.units_assigned = []
-          self.task_list.append( t )
+          self.task_list.add( t )
         elif task.name == "Explore":
-          self.task_list.append( tasks.WanderAndKillTask(self, (0,0) ) )
+          self.task_list.add( tasks.WanderAndKillTask(self, (0,0) ) )
 
         # reclaim the units
         if not task.is_default:
@@ -101,24 +113,41 @@ class WorkSmarter(ai.AI):
   
         self.task_list.remove(task)
         
-    # sort tasks based on priority
-    self.task_list = sorted(self.task_list, key = lambda t: t.priority)
+    # tasks by priority, kept for the whole turn even if update() changes priorities
+    ordered = self.task_list.ordered()
     
-    # assign units
-    for task in self.task_list:      
-      if task.is_default: # default task should always be lowest priority and hence called last
+    # assign units, in one batch by priority tier, see assignment.assign()
+    # default tasks are in it for their units_minimum, which keeps those drones free of the other tasks
+    taken = set()
+    found = assignment.assign(ordered, self.drones)
+    for task, drones in found.items():
+      if task.is_default:
+        continue
+
+      for drone in drones:
+        task.add_unit(drone)
+        taken.add(drone)
+
+    # default tasks get whatever drones are left once the others are filled
+    self.drones = [ drone for drone in self.drones if not drone in taken ]
+    for task in ordered:
+      if task.is_default:
         task.units_assigned = self.drones
-      else:
-        while not task.is_full() and len(self.drones) > 0:
-          # get closest drone
-          drone = closest_thing( task.position, self.drones )
-          task.add_unit(drone)
-          self.drones.remove(drone)
     
+    # tell tasks what changed, those it didn't concern skip their update
+    owned = frozenset(self.my_buildings)
+    if owned != self.owned:
+      self.owned = owned
+      self.task_list.notify("buildings")
+
+    for task in self.task_list.listening("enemies"):
+      if task.sees_enemies():
+        task.dirty = True
+
     # update tasks
-    for task in self.task_list:
-      task.update()
+    for task in ordered:
+      task.refresh()
 
     # do actions for each task
-    for task in self.task_list:
+    for task in ordered:
       task.do_action()